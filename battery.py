@@ -0,0 +1,97 @@
+"""Battery voltage sampling."""
+import array
+import machine
+import config
+import state
+
+_samples = None
+
+
+def voltage():
+    """Get the battery voltage, also updating the voltage trend.
+
+    The ADC is read in integer microvolts, more reads being taken while the
+    readings are noisy, and outliers are rejected before averaging.
+    """
+    uv = sample_uv(machine.ADC(machine.Pin(config.BATTERY_PIN)))
+    volts = uv * config.RESISTOR_RATIO / 1000000
+    _update_trend(int(volts * 1000))
+    return volts
+
+
+def trend():
+    """Get the smoothed battery voltage over previous wakes, 0 if unknown."""
+    return state.get('battery_mv') / 1000
+
+
+def sample_uv(adc, min_reads=None, max_reads=None):
+    """Read an ADC, returning the trimmed mean in microvolts.
+
+    Reads are taken in batches of min_reads until the mean absolute
+    deviation is within config.ADC_SPREAD_UV or max_reads are taken, then
+    readings further than twice that deviation from the mean are rejected.
+
+    Args:
+        adc: Object with a read_uv() method returning an int, e.g. a
+            machine.ADC.
+        min_reads: Reads per batch, default config.ADC_MIN_READS.
+        max_reads: Maximum reads, default config.ADC_READS.
+
+    Raises:
+        ValueError: min_reads or max_reads is less than one.
+    """
+    global _samples
+    if min_reads is None:
+        min_reads = config.ADC_MIN_READS
+    if max_reads is None:
+        max_reads = config.ADC_READS
+    if min_reads < 1 or max_reads < 1:
+        raise ValueError('ADC reads must be at least 1')
+    if _samples is None or len(_samples) < max_reads:
+        _samples = array.array('i', bytearray(4 * max_reads))
+    samples = _samples
+
+    n = 0
+    total = 0
+    while n < max_reads:
+        for i in range(n, min(n + min_reads, max_reads)):
+            uv = adc.read_uv()
+            samples[i] = uv
+            total += uv
+        n = i + 1
+        mean = total // n
+        spread = _deviation(samples, n, mean)
+        if spread <= config.ADC_SPREAD_UV:
+            break
+
+    # Trimmed mean, rejecting outliers
+    limit = 2 * spread
+    total = 0
+    count = 0
+    for i in range(n):
+        if abs(samples[i] - mean) <= limit:
+            total += samples[i]
+            count += 1
+    return total // count if count else mean
+
+
+def _deviation(samples, n, mean):
+    # Mean absolute deviation, squares of microvolts overflow small ints
+    total = 0
+    for i in range(n):
+        total += abs(samples[i] - mean)
+    return total // n
+
+
+def _update_trend(mv):
+    trend_mv = state.get('battery_mv')
+    if trend_mv == 0:
+        trend_mv = mv
+    else:
+        # Exponential moving average, the step rounded to nearest the same
+        # way either side so the trend settles on a steady reading
+        diff = mv - trend_mv
+        step = (abs(diff) + config.BATTERY_TREND_WAKES // 2) // \
+            config.BATTERY_TREND_WAKES
+        trend_mv += step if diff > 0 else -step
+    state.set('battery_mv', min(max(trend_mv, 0), 0xffff))
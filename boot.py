@@ -1,4 +1,17 @@
 """This file is executed on every boot (including wake-boot from deepsleep)."""
 import gc
+import machine
+import config
+import buffers
+
+# The relay driver gates have no pulldowns, drive them low for the whole
+# wake so noise cannot latch the relay, pulses are sent by water_system
+for pin_id in (config.WATER_ON_PIN, config.WATER_OFF_PIN):
+    machine.Pin(pin_id, machine.Pin.OUT, value=0)
 
 gc.collect()
+# Reserve buffers before the heap fragments (config.py)
+buffers.reserve_pool()
+# Collect once a quarter of the free heap has been allocated, rather than
+# only when an allocation fails, wake phases adjust this (config.py)
+gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
@@ -0,0 +1,82 @@
+"""Pool of preallocated buffers.
+
+Buffers reserved at boot, while the heap is unfragmented, are lent out for
+network reads, parsing and file transfers, so these do not allocate and
+fragment the heap when TLS needs large contiguous blocks.
+"""
+import config
+
+_free = []
+# Number of buffers reserved, the pool never holds more
+_reserved = 0
+
+
+class _Borrowed:
+    def __init__(self, size):
+        self.size = size
+        self.buffer = None
+
+    def __enter__(self):
+        self.buffer = take(self.size)
+        return self.buffer
+
+    def __exit__(self, *args):
+        give(self.buffer)
+        self.buffer = None
+
+
+def reserve(size, count=1):
+    """Add count buffers of size bytes to the pool."""
+    global _reserved
+    _reserved += count
+    for _ in range(count):
+        _free.append(bytearray(size))
+
+
+def reserve_pool():
+    """Reserve the buffers in config.BUFFER_POOL, call early at boot."""
+    for size, count in config.BUFFER_POOL:
+        reserve(size, count)
+
+
+def borrow(size):
+    """Context manager lending the smallest free buffer of at least size.
+
+    Usage:
+        with buffers.borrow(1024) as buffer:
+            count = stream.readinto(buffer)
+    """
+    return _Borrowed(size)
+
+
+def take(size):
+    """Take the smallest free buffer of at least size bytes.
+
+    Allocates a buffer if none is free. Prefer borrow() unless the buffer
+    outlives a block.
+    """
+    best = -1
+    for i in range(len(_free)):
+        length = len(_free[i])
+        if length >= size and (best < 0 or length < len(_free[best])):
+            best = i
+    if best < 0:
+        return bytearray(size)
+    return _free.pop(best)
+
+
+def give(buffer):
+    """Return a buffer from take() to the pool.
+
+    Once as many buffers as were reserved are free, the smallest is dropped,
+    so buffers allocated by take() do not grow the pool.
+    """
+    if len(_free) < _reserved:
+        _free.append(buffer)
+        return
+    smallest = 0
+    for i in range(1, len(_free)):
+        if len(_free[i]) < len(_free[smallest]):
+            smallest = i
+    if _free and len(buffer) > len(_free[smallest]):
+        _free[smallest] = buffer
@@ -2,13 +2,17 @@
 import machine
 import utime
 import urtc
-import ntptime
 import config
+from functools import lru_cache
 
 _SECS_IN_HOUR = 3600
 _SECS_IN_DAY = 24 * _SECS_IN_HOUR
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+           'Oct', 'Nov', 'Dec')
 
-_i2c = machine.SoftI2C(sda=config.SDA_PIN, scl=config.SCL_PIN)
+_rtc = None
+# Set once the RTC has been compared with a server's time this run
+_drift_checked = False
 
 
 def datetime():
@@ -31,6 +35,11 @@ def gmt():
     return _get_rtc().datetime()
 
 
+def seconds():
+    """Get current GMT date/time from RTC as seconds since 2000-01-01."""
+    return urtc.tuple2seconds(gmt())
+
+
 def day_of_month(days_in_future=0):
     """Get the day of the month."""
     secs = urtc.tuple2seconds(datetime())
@@ -39,26 +48,20 @@ def day_of_month(days_in_future=0):
     return future[2]
 
 
-def greater_than_tommorow(date):
-    secs = urtc.tuple2seconds(datetime()) + _SECS_IN_DAY
-
-    year, month, day = date.split('-')
-    curr = urtc.datetime_tuple(int(year), int(month), int(day), 0, 0, 0, 0, 0)
-    curr_sec = urtc.tuple2seconds(curr)
-
-    return curr_sec > secs
+def midnight():
+    """Get the start of the timezone day as seconds since 2000-01-01."""
+    dt = datetime()
+    return _midnight_seconds(dt.year, dt.month, dt.day)
 
 
-def equal_to_today(date):
-    dt = datetime()
-    today = urtc.datetime_tuple(dt.year, dt.month, dt.day, 0, 0, 0, 0, 0)
-    secs = urtc.tuple2seconds(today)
+@lru_cache(maxsize=4)
+def date_seconds(date):
+    """Get the start of a YYYY-MM-DD date as seconds since 2000-01-01.
 
+    Cached, the forecast repeats each date many times.
+    """
     year, month, day = date.split('-')
-    curr = urtc.datetime_tuple(int(year), int(month), int(day), 0, 0, 0, 0, 0)
-    curr_sec = urtc.tuple2seconds(curr)
-
-    return curr_sec == secs
+    return _midnight_seconds(int(year), int(month), int(day))
 
 
 def timestamp():
@@ -77,6 +80,7 @@ def future(minutes):
 
 def initialize_rtc_from_ntp():
     """Initialize RTC date/time from NTP."""
+    import ntptime
     ntptime.settime()
     utime.sleep(5)
 
@@ -92,6 +96,45 @@ def initialize_rtc_from_ntp():
     _get_rtc().datetime(time_to_set)
 
 
+def correct_drift(http_date):
+    """Correct the RTC from an HTTP Date header, once per run.
+
+    The RTC is only set when it differs from the server by more than
+    config.RTC_MAX_DRIFT_SECS, as the header has one second resolution.
+
+    Args:
+        http_date: Date header value, e.g. 'Mon, 19 Oct 2026 05:00:01 GMT',
+            None if the response had none.
+
+    Returns:
+        Seconds the RTC was ahead of the server if it was corrected, else
+        None.
+    """
+    global _drift_checked
+    if http_date is None or _drift_checked:
+        return None
+    try:
+        day, month, year, hms = http_date.split()[1:5]
+        hour, minute, second = hms.split(':')
+        server_secs = urtc.tuple2seconds(urtc.datetime_tuple(
+            int(year), _MONTHS.index(month) + 1, int(day), 0, int(hour),
+            int(minute), int(second), 0))
+    except ValueError:
+        return None
+    _drift_checked = True
+    drift = seconds() - server_secs
+    if abs(drift) <= config.RTC_MAX_DRIFT_SECS:
+        return None
+    _get_rtc().datetime(urtc.seconds2tuple(server_secs))
+    return drift
+
+
+def reset_drift_check():
+    """Let correct_drift() check the RTC again, at the start of a run."""
+    global _drift_checked
+    _drift_checked = False
+
+
 def configure_rtc_alarm(alarm_time):
     """Configure alarm time of RTC."""
     rtc = _get_rtc()
@@ -100,5 +143,15 @@ def configure_rtc_alarm(alarm_time):
     rtc.alarm_time(alarm_time, alarm=1)  # Configure alarm time of RTC
 
 
+def _midnight_seconds(year, month, day):
+    return urtc.tuple2seconds(
+        urtc.datetime_tuple(year, month, day, 0, 0, 0, 0, 0))
+
+
 def _get_rtc():
-    return urtc.DS3231(_i2c)
+    global _rtc
+    if _rtc is None:
+        i2c = machine.SoftI2C(sda=machine.Pin(config.SDA_PIN),
+                              scl=machine.Pin(config.SCL_PIN))
+        _rtc = urtc.DS3231(i2c)
+    return _rtc
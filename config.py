@@ -1,5 +1,4 @@
 """Configuration property values."""
-from machine import Pin
 import urtc
 
 # NZDT, 13 hours ahead
@@ -18,16 +17,125 @@ RTC_ALARM = urtc.datetime_tuple(None, None, None, None, 5, 0, None, None)
 SLEEP_ONE_MINUTE = \
     urtc.datetime_tuple(None, None, None, None, None, None, 0, None)
 
-SCL_PIN = Pin(7)
-SDA_PIN = Pin(6)
-WAKEUP_PIN = Pin(4, Pin.IN, Pin.PULL_UP)
-WATER_ON_PIN = Pin(3, Pin.OUT, Pin.PULL_DOWN, value=0)
-WATER_OFF_PIN = Pin(2, Pin.OUT, Pin.PULL_DOWN, value=0)
-NO_SLEEP_PIN = Pin(21, Pin.IN, Pin.PULL_DOWN, value=0)
-BATTERY_PIN = Pin(5)  # ADC
+# GPIO numbers, the pins are configured where first used
+SCL_PIN = 7
+SDA_PIN = 6
+WAKEUP_PIN = 4
+WATER_ON_PIN = 3
+WATER_OFF_PIN = 2
+NO_SLEEP_PIN = 21
+BATTERY_PIN = 5  # ADC
 
-# Number of ADC reads to take average of
+# Once rain is occurring, the rain thresholds are lowered by this much until
+# it stops, so the system is not switched on and off around a threshold
+RAIN_HYSTERESIS_MM = 1
+
+# Reuse a forecast read within this many minutes on the same day rather than
+# downloading it again, 0 to always download. met.no updates hourly. A
+# forecast abandoned once rain is decided is never reused.
+FORECAST_CACHE_MINS = 60
+
+# Correct the RTC from the time of HTTP responses when it is more than this
+# many seconds out
+RTC_MAX_DRIFT_SECS = 10
+
+# Optional tipping bucket rain gauge, a reed switch from this GPIO to ground,
+# None if not fitted. When fitted it replaces the observed rain from ECAN.
+# Only GPIO0-5 wake the ESP32-C3 from deep sleep and 2-5 are used, so it must
+# be 0 or 1. Needs the GPIO wake of esp32c3_wakeup_ext.patch, which wakes when
+# any wake pin is low, with ext1 the alarm alone would not wake the board.
+RAIN_GAUGE_PIN = None
+RAIN_GAUGE_MM_PER_TIP = 0.2
+# Longest time to wait for the switch to open again after a tip
+RAIN_GAUGE_RELEASE_MS = 500
+
+# The latching relay is only pulsed when the system state changes, or after
+# this many wakes to ensure it has not drifted from the recorded state
+RELAY_REASSERT_WAKES = 7
+
+# Maximum number of ADC reads to take average of
 ADC_READS = 100
+# ADC reads are taken in batches of this size until their mean absolute
+# deviation is within ADC_SPREAD_UV microvolts, or ADC_READS are taken
+ADC_MIN_READS = 16
+ADC_SPREAD_UV = 5000
+# Wakes over which the battery voltage trend is smoothed
+BATTERY_TREND_WAKES = 8
 
 # WiFi retry - time system will sleep for if WiFi connect fails
 WIFI_RETRY_MINS = 5
+
+# System log, rotated by renaming into LOG_FILE.1 (newest) to
+# LOG_FILE.<LOG_SEGMENTS> (oldest) once it reaches its share of the budget
+LOG_FILE = 'system.log'
+# Total flash budget in bytes for the log file and all of its segments
+LOG_MAX_BYTES = 64 * 1024
+# Number of rotated segments kept in addition to the active log file
+LOG_SEGMENTS = 3
+
+# Garbage collection policy per wake phase, bytes allocated between
+# automatic collections. The heap is collected on entry to a listed phase and
+# the previous threshold restored on exit.
+GC_THRESHOLDS = {
+    'rain': 8 * 1024,
+    'forecast': 16 * 1024,
+    'upload': 8 * 1024,
+}
+# Log heap high water marks and largest free block per phase. Finding the
+# largest free block is slow, so only enable when investigating.
+HEAP_PROFILE = False
+
+# Upload time awake in ms so far this wake as ThingSpeak field 7
+THINGSPEAK_TIMING = False
+
+# Energy estimate, upload the charge used by the previous wake in uAh as
+# ThingSpeak field 8
+THINGSPEAK_ENERGY = False
+# Battery capacity in mAh and wakes per day (RTC_ALARM)
+BATTERY_MAH = 1600
+WAKES_PER_DAY = 1
+# Current draw in mA when awake with the radio off, with WiFi on, during TLS
+# handshakes and while pulsing the relay coil
+CPU_MA = 25
+RADIO_MA = 90
+TLS_MA = 100
+RELAY_MA = 150
+# Current draw in deep sleep, including the DS3231 and voltage divider, in uA
+SLEEP_UA = 60
+
+# Log buffer in RTC memory (0 to disable), records are written to LOG_FILE,
+# or LOG_EVENTS_FILE in structured mode, when another wake like the last would
+# not fit, every LOG_FLUSH_WAKES wakes, or on error. Shares the 2048 bytes of
+# RTC user memory with the state module. A wake logs about 1.5KB of text, so
+# only the 12 byte records of structured mode stage several wakes.
+LOG_BUFFER_BYTES = 1536
+LOG_FLUSH_WAKES = 8
+
+# Structured logging - events are written as compact binary records to
+# LOG_EVENTS_FILE (decode with host/log_decode.py), only warnings and errors
+# are written to LOG_FILE as text. False logs everything as text, including
+# the Timing ms and Heap bytes records, but writes flash on most wakes.
+LOG_STRUCTURED = True
+LOG_EVENTS_FILE = 'system.evt'
+
+# Buffers reserved at boot as (size, count), lent out by the buffers module,
+# sized for the forecast parser window
+BUFFER_POOL = ((2048, 1),)
+
+# FTP file transfer buffer, one per passive data port, reserved when the
+# server starts
+FTP_BUFFER_BYTES = 4096
+# FTP passive data ports, limits the number of concurrent transfers
+FTP_DATA_PORTS = (13333, 13334)
+# Window for compressed log downloads (system.log.gz), 2^bits bytes of RAM.
+# Needs the deflate module of MicroPython 1.21 or later.
+FTP_GZIP_WBITS = 10
+# How often the background FTP server (uftpd) checks its sockets
+FTP_POLL_MS = 20
+
+# Minutes between runs in service mode (water_system.service)
+SERVICE_INTERVAL_MINS = 15
+
+# Diagnostics HTTP server port and log download buffer
+HTTP_PORT = 80
+HTTP_BUFFER_BYTES = 2048
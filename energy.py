@@ -0,0 +1,32 @@
+"""Energy accounting, estimates the charge used by a wake."""
+import config
+import timing
+
+# Phases during which the WiFi radio is on
+_RADIO_PHASES = ('wifi', 'rain', 'forecast', 'upload', 'disconnect')
+
+
+def wake_uah():
+    """Estimate the charge used so far this wake in uAh.
+
+    Combines the phase durations recorded by the timing module with the
+    current draws in config.
+    """
+    radio_ms = 0
+    for name in _RADIO_PHASES:
+        radio_ms += timing.total_ms(name)
+    tls_ms = timing.total_ms('tls', nested=True)
+    relay_ms = timing.total_ms('relay')
+    cpu_ms = max(timing.awake_ms() - radio_ms - relay_ms, 0)
+    # mA x ms / 3600 = uAh
+    return (cpu_ms * config.CPU_MA
+            + (radio_ms - tls_ms) * config.RADIO_MA
+            + tls_ms * config.TLS_MA
+            + relay_ms * config.RELAY_MA) // 3600
+
+
+def battery_days(uah_per_wake):
+    """Project days of battery life from a full charge."""
+    uah_per_day = (uah_per_wake * config.WAKES_PER_DAY
+                   + config.SLEEP_UA * 24)
+    return config.BATTERY_MAH * 1000 // uah_per_day
@@ -0,0 +1,63 @@
+"""Structured log events.
+
+Events are logged by identifier with up to three integer arguments, either
+formatted as text or, in structured mode, packed into fixed size binary
+records. This module is shared with the host side decoder, so must only
+depend on built-ins.
+"""
+
+# Binary record layout: GMT seconds since 2000-01-01, event identifier and
+# three signed 16 bit arguments (unused arguments are zero).
+RECORD = '<IHhhh'
+RECORD_SIZE = 12
+MAX_ARGS = 3
+
+AWAKE = 1
+BATTERY = 2
+HTTP_STATUS = 3
+RAINFALL = 4
+FORECAST = 5
+SYSTEM_ON = 6
+SYSTEM_OFF = 7
+WIFI_RETRY = 8
+SLEEPING = 9
+NOT_SLEEPING = 10
+RELAY_UNCHANGED = 11
+ENERGY = 12
+FORECAST_SKIPPED = 13
+FORECAST_STOPPED = 14
+CLOCK_CORRECTED = 15
+FORECAST_CACHED = 16
+
+# Event identifier: (text template, divisor applied to each argument)
+TEMPLATES = {
+    AWAKE: ('Awake: %d', 1),
+    BATTERY: ('Battery %.2fV, trend %.2fV', 1000),
+    HTTP_STATUS: ('HTTP status: %d', 1),
+    RAINFALL: ('Last hour %.1fmm, today %.1fmm', 10),
+    FORECAST: ('Today %.1fmm, tomorrow %.1fmm', 10),
+    SYSTEM_ON: ('System ON', 1),
+    SYSTEM_OFF: ('System OFF', 1),
+    WIFI_RETRY: ('Set one minute sleep, attempts %d', 1),
+    SLEEPING: ('Sleeping...', 1),
+    NOT_SLEEPING: ('Not sleeping', 1),
+    RELAY_UNCHANGED: ('Relay unchanged, %d wakes since pulsed', 1),
+    ENERGY: ('Energy %duAh, battery life %d days', 1),
+    FORECAST_SKIPPED: ('Forecast skipped, rain observed', 1),
+    FORECAST_STOPPED: ('Forecast stopped, rain forecast', 1),
+    CLOCK_CORRECTED: ('RTC corrected, it was %ds ahead', 1),
+    FORECAST_CACHED: ('Cached today %.1fmm, tomorrow %.1fmm', 10),
+}
+
+
+def to_text(event_id, args):
+    """Format an event and its integer arguments as text."""
+    if event_id not in TEMPLATES:
+        return 'Event %d' % event_id
+    template, divisor = TEMPLATES[event_id]
+    count = template.count('%')
+    if not count:
+        return template
+    if divisor != 1:
+        args = [a / divisor for a in args]
+    return template % tuple(args[:count])
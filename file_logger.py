@@ -1,6 +1,12 @@
 """File logger."""
 import io
+import uos
+import ustruct
 import logging
+import config
+import clock
+import events
+import state
 
 
 class File:
@@ -17,24 +23,225 @@ class File:
         return File.__logger
 
     @staticmethod
-    def close_log():
-        """Static method to close the file logger."""
+    def close_log(flush=False):
+        """Static method to close the file logger.
+
+        Args:
+            flush: Write any records buffered in RTC memory to the log file.
+        """
         if File.__instance is not None:
-            File.__instance.__close_file()
+            File.__instance.__close_file(flush)
             File.__instance = None
         File.__logger = None
 
+    @staticmethod
+    def flush_log():
+        """Static method to write records buffered in RTC memory to file."""
+        File.logger()
+        File.close_log(flush=True)
+
+    @staticmethod
+    def event(event_id, *args):
+        """Static method to log an event with up to three integer arguments.
+
+        In structured mode the event is appended to the events file as a
+        binary record, staged in RTC memory like the text log, otherwise it
+        is formatted and logged as text.
+        """
+        if config.LOG_STRUCTURED:
+            File.logger()
+            File.__instance.__write_event(event_id, args)
+        else:
+            logger = File.logger()
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(events.to_text(event_id, args))
+
     def __init__(self):
         """Virtually private constructor."""
         if File.__logger is not None:
             raise Exception("This class is a singleton!")
         else:
-            self.__stream = io.open('system.log', mode='a')
-            logging.basicConfig(level=logging.INFO, stream=self.__stream)
+            self.__events = None
+            if config.LOG_BUFFER_BYTES > 0 and config.LOG_STRUCTURED:
+                # Event records are staged, the text log is only warnings
+                # and errors so is written directly
+                self.__events = RtcBuffer(config.LOG_EVENTS_FILE,
+                                          config.LOG_BUFFER_BYTES)
+                self.__stream = TextFile(config.LOG_FILE, self.__events)
+            elif config.LOG_BUFFER_BYTES > 0:
+                self.__stream = RtcBuffer(config.LOG_FILE,
+                                          config.LOG_BUFFER_BYTES)
+            else:
+                rotate(config.LOG_FILE)
+                self.__stream = io.open(config.LOG_FILE, mode='a')
+            self.__record = bytearray(events.RECORD_SIZE)
+            level = logging.WARNING if config.LOG_STRUCTURED else logging.INFO
+            logging.basicConfig(level=level, stream=self.__stream,
+                                timesource=clock.timestamp)
             File.__logger = logging.getLogger('system')
             File.__instance = self
 
-    def __close_file(self):
+    def __write_event(self, event_id, args):
+        if self.__events is None:
+            rotate(config.LOG_EVENTS_FILE)
+            self.__events = io.open(config.LOG_EVENTS_FILE, mode='ab')
+        a = [0] * events.MAX_ARGS
+        for i in range(min(len(args), events.MAX_ARGS)):
+            a[i] = min(max(round(args[i]), -32768), 32767)
+        ustruct.pack_into(events.RECORD, self.__record, 0, clock.seconds(),
+                          event_id, a[0], a[1], a[2])
+        self.__events.write(self.__record)
+
+    def __close_file(self, flush):
         if self.__stream is not None:
+            if flush:
+                self.__stream.flush()
             self.__stream.close()
             self.__stream = None
+        if self.__events is not None:
+            if flush:
+                self.__events.flush()
+            self.__events.close()
+            self.__events = None
+
+
+class RtcBuffer(io.IOBase):
+    """Log stream staged in RTC memory, which survives deep sleep.
+
+    Records are appended to RTC memory and only written to the log file
+    every config.LOG_FLUSH_WAKES wakes, when another wake logging as much as
+    this one would not fit or when flushed, which the logger does for
+    errors. The buffer is held in the state module, which must be saved for
+    it to survive deep sleep.
+    """
+
+    def __init__(self, path, size):
+        """Constructor, restores records buffered by previous wakes."""
+        self.__path = path
+        self.__size = size
+        self.__wakes = state.get('log_wakes') + 1
+        self.__data = bytearray(size)
+        buffered = state.log()
+        self.__length = min(len(buffered), size)
+        self.__data[0:self.__length] = buffered[0:self.__length]
+        # Bytes written this wake
+        self.__added = 0
+        self.__flush_on_close = False
+
+    def write(self, buf):
+        """Append text or bytes to the buffer."""
+        if isinstance(buf, str):
+            buf = buf.encode()
+        n = len(buf)
+        self.__added += n
+        if self.__length + n > self.__size:
+            self.__write_file()
+        if n > self.__size:
+            self.__write_file(buf)
+        else:
+            self.__data[self.__length:self.__length + n] = buf
+            self.__length += n
+        return n
+
+    def flush(self):
+        """Write the buffered records to the log file now."""
+        self.__write_file()
+        self.__flush_on_close = True
+
+    def close(self):
+        """Update the buffer in the state, writing to file if due."""
+        if self.__data is None:
+            return
+        if (self.__flush_on_close
+                or self.__wakes >= config.LOG_FLUSH_WAKES
+                or self.__length + self.__added > self.__size):
+            self.__write_file()
+        state.set('log_wakes', min(self.__wakes, 255))
+        state.set_log(memoryview(self.__data)[0:self.__length])
+        self.__data = None
+
+    def __write_file(self, extra=None):
+        if self.__length > 0 or extra:
+            rotate(self.__path)
+            with io.open(self.__path, mode='ab') as file:
+                file.write(memoryview(self.__data)[0:self.__length])
+                if extra:
+                    file.write(extra)
+        self.__length = 0
+        self.__wakes = 0
+
+
+class TextFile(io.IOBase):
+    """Text log appended directly to file, opened on the first write.
+
+    Flushing, which the logger does for errors, also writes the records
+    staged in the given RtcBuffer.
+    """
+
+    def __init__(self, path, staged):
+        """Constructor."""
+        self.__path = path
+        self.__staged = staged
+        self.__file = None
+
+    def write(self, buf):
+        """Append text to the file."""
+        if self.__file is None:
+            rotate(self.__path)
+            self.__file = io.open(self.__path, mode='a')
+        return self.__file.write(buf)
+
+    def flush(self):
+        """Write the file and the staged records now."""
+        if self.__file is not None:
+            self.__file.flush()
+        self.__staged.flush()
+
+    def close(self):
+        """Close the file, if it was opened."""
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+def rotate(path, max_bytes=None, segments=None):
+    """Rotate a log file into numbered segments once it is full.
+
+    The budget of max_bytes is shared equally between the active file and
+    its segments, so the active file never grows beyond one share. Rotation
+    only renames files, the oldest segment is deleted. Returns True if the
+    file was rotated.
+    """
+    if max_bytes is None:
+        max_bytes = config.LOG_MAX_BYTES
+    if segments is None:
+        segments = config.LOG_SEGMENTS
+
+    if _file_size(path) < max_bytes // (segments + 1):
+        return False
+
+    _remove('%s.%d' % (path, segments))
+    for i in range(segments - 1, 0, -1):
+        try:
+            uos.rename('%s.%d' % (path, i), '%s.%d' % (path, i + 1))
+        except OSError:
+            pass  # Segment not created yet
+    if segments > 0:
+        uos.rename(path, path + '.1')
+    else:
+        _remove(path)
+    return True
+
+
+def _file_size(path):
+    try:
+        return uos.stat(path)[6]
+    except OSError:
+        return 0
+
+
+def _remove(path):
+    try:
+        uos.remove(path)
+    except OSError:
+        pass
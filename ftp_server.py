@@ -0,0 +1,677 @@
+"""FTP server engine shared by the ftp, ftp_thread and uftpd front-ends.
+
+Serves several clients at once from a single select.poll loop. Data
+connections are non-blocking and transfers advance one buffer each time the
+socket is ready, so a slow client does not stall the others. Passive mode
+data connections use a small pool of ports, one per concurrent transfer.
+
+Based on the servers by Christopher Popp, Paul Sokolovsky and Robert
+Hammelrath. Distributed under MIT License.
+"""
+import gc
+import io
+import select
+import socket
+import network
+import uerrno
+import uos
+import utime
+import buffers
+import config
+
+_COMMAND_TIMEOUT_MS = 300000
+_SEND_TIMEOUT = 10
+_MAX_SESSIONS = 4
+_MAX_LINE = 512
+_MONTHS = ("", "Jan", "Feb", "Mar", "Apr", "May", "Jun",
+           "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_TAIL = ".tail"
+_GZIP = ".gz"
+
+# Offset each file's last tail download ended at
+_tail_marks = {}
+
+
+class Server:
+    """Poll driven FTP server.
+
+    Either call serve() to run until stopped, or start() and then
+    poll_once() regularly, e.g. from a thread or timer.
+
+    Args:
+        port: Command port.
+        data_ports: Passive mode data ports, one transfer at a time on each.
+        verbose: 0 quiet, 1 connections and commands, 2 also errors.
+        stop_on_quit: Stop the server when a client sends QUIT.
+    """
+    _reserved_buffers = False
+
+    def __init__(self, port=21, data_ports=None, verbose=0,
+                 stop_on_quit=False):
+        self.port = port
+        self.data_ports = data_ports or config.FTP_DATA_PORTS
+        self.verbose = verbose
+        self.stop_on_quit = stop_on_quit
+        self.addr = None
+        self.running = False
+        self._poll = None
+        self._handlers = {}
+        self._listener = None
+        self._data_listeners = {}
+        self._sessions = []
+        self._free_ports = []
+        self._reserved = {}
+        # Whether <file>.gz downloads are possible, set by start()
+        self.gzip = False
+
+    def start(self):
+        """Listen for connections, returns the server address or None."""
+        self.addr = _interface_address()
+        if self.addr is None:
+            print("No active connection")
+            return None
+        self._poll = select.poll()
+        self._listener = self._listen(self.port, self._accept_command)
+        for port in self.data_ports:
+            self._data_listeners[port] = self._listen(
+                port, lambda event, port=port: self._accept_data(port))
+        self._free_ports = list(self.data_ports)
+        try:
+            import deflate  # noqa: F401
+            self.gzip = True
+        except ImportError:
+            self.gzip = False
+            print("No deflate module (MicroPython 1.21 or later), "
+                  "compressed downloads disabled")
+        if not self._reserved_buffers:
+            buffers.reserve(config.FTP_BUFFER_BYTES, len(self.data_ports))
+            Server._reserved_buffers = True
+        self.running = True
+        return self.addr
+
+    def serve(self):
+        """Run in the foreground until stopped."""
+        if self.start() is None:
+            return
+        print("FTP Server started on ", self.addr)
+        try:
+            while self.running:
+                self.poll_once(1000)
+        finally:
+            self.stop()
+
+    def poll_once(self, timeout_ms=0):
+        """Handle the sockets which are ready, waiting up to timeout_ms.
+
+        Returns:
+            False once the server has stopped.
+        """
+        if not self.running:
+            return False
+        for entry in self._poll.poll(timeout_ms):
+            handler = self._handlers.get(entry[0])
+            if handler is not None:
+                handler(entry[1])
+        now = utime.ticks_ms()
+        for session in self._sessions[:]:
+            if (session.transfer is None and utime.ticks_diff(
+                    now, session.last) > _COMMAND_TIMEOUT_MS):
+                self.log(1, "Session timeout:", session.remote_addr)
+                session.close()
+        return self.running
+
+    def stop(self):
+        """Close all connections and stop listening."""
+        self.running = False
+        for session in self._sessions[:]:
+            session.close()
+        for sock in [self._listener] + list(self._data_listeners.values()):
+            if sock is not None:
+                self.unwatch(sock)
+                sock.close()
+        self._listener = None
+        self._data_listeners = {}
+
+    def log(self, level, *args):
+        if self.verbose >= level:
+            print(*args)
+
+    def watch(self, sock, mask, handler):
+        self._poll.register(sock, mask)
+        self._handlers[sock] = handler
+
+    def unwatch(self, sock):
+        if self._handlers.pop(sock, None) is not None:
+            self._poll.unregister(sock)
+
+    def reserve_port(self, session):
+        """Reserve a passive data port for the session, None if all busy."""
+        if not self._free_ports:
+            return None
+        port = self._free_ports.pop()
+        self._reserved[port] = session
+        return port
+
+    def release_port(self, port):
+        if self._reserved.pop(port, None) is not None:
+            self._free_ports.append(port)
+
+    def remove(self, session):
+        if session in self._sessions:
+            self._sessions.remove(session)
+
+    def session_count(self):
+        return len(self._sessions)
+
+    def _listen(self, port, handler):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(socket.getaddrinfo("0.0.0.0", port)[0][4])
+        sock.listen(1)
+        sock.setblocking(False)
+        self.watch(sock, select.POLLIN, handler)
+        return sock
+
+    def _accept_command(self, event):
+        try:
+            sock, remote_addr = self._listener.accept()
+        except OSError:
+            return
+        if len(self._sessions) >= _MAX_SESSIONS:
+            sock.sendall("421 Too many connections.\r\n")
+            sock.close()
+            return
+        self.log(1, "FTP connection from:", remote_addr[0])
+        self._sessions.append(_Session(self, sock, remote_addr[0]))
+
+    def _accept_data(self, port):
+        try:
+            sock, data_addr = self._data_listeners[port].accept()
+        except OSError:
+            return
+        session = self._reserved.get(port)
+        self.release_port(port)
+        if session is None:
+            sock.close()
+            return
+        self.log(1, "FTP Data connection from:", data_addr[0])
+        session.port = None
+        session.attach(sock)
+
+
+class _Session:
+    """Command connection of one client and its data transfer."""
+
+    def __init__(self, server, sock, remote_addr):
+        self.server = server
+        self.sock = sock
+        self.remote_addr = remote_addr
+        self.cwd = '/'
+        self.rest = 0
+        self.fromname = None
+        self.line = b''
+        self.closed = False
+        self.last = utime.ticks_ms()
+        # Reserved passive port or (address, port) given by PORT
+        self.port = None
+        self.active_addr = None
+        self.data = None
+        self.buffer = None
+        self.transfer = None
+        self.pending = None
+        sock.settimeout(_SEND_TIMEOUT)
+        server.watch(sock, select.POLLIN, self._readable)
+        self.reply("220 Hello, this is the ESP32.\r\n")
+
+    def reply(self, text):
+        self.sock.sendall(text)
+
+    def close(self):
+        self.closed = True
+        self._close_data()
+        self.server.unwatch(self.sock)
+        self.sock.close()
+        self.server.remove(self)
+
+    def attach(self, sock):
+        """Use sock as the data connection, starting any waiting transfer."""
+        sock.setblocking(False)
+        self.data = sock
+        if self.pending is not None:
+            pending = self.pending
+            self.pending = None
+            self._begin(*pending)
+
+    def _readable(self, event):
+        try:
+            data = self.sock.recv(128)
+        except OSError:
+            data = b''
+        if not data:
+            self.server.log(1, "Client disappeared")
+            self.close()
+            return
+        self.line += data
+        if len(self.line) > _MAX_LINE:
+            self.close()
+            return
+        self.last = utime.ticks_ms()
+        while b'\n' in self.line:
+            line, self.line = self.line.split(b'\n', 1)
+            try:
+                self._execute(line.decode().rstrip('\r'))
+            except Exception as err:
+                self.server.log(2, "Exception in command:", err)
+            if self.closed:
+                return
+
+    def _execute(self, data):
+        if not data:
+            return
+        gc.collect()
+        command = data.split(" ")[0].upper()
+        payload = data[len(command):].lstrip()
+        path = get_absolute_path(self.cwd, payload)
+        self.server.log(1, "Command={}, Payload={}".format(command, payload))
+
+        if command == "USER" or command == "PASS":
+            self.reply("230 Logged in.\r\n")
+        elif command == "SYST":
+            self.reply("215 UNIX Type: L8\r\n")
+        elif command == "NOOP" or command == "TYPE":
+            self.reply("200 OK\r\n")
+        elif command == "FEAT":
+            self.reply("211-Features:\r\n SIZE\r\n MDTM\r\n REST STREAM\r\n"
+                       "211 End\r\n")
+        elif command == "ABOR":
+            if self.transfer is not None or self.pending is not None:
+                self.pending = None
+                self._end("426 Aborted.\r\n")
+            self.reply("226 OK\r\n")
+        elif command == "QUIT":
+            self.reply("221 Bye.\r\n")
+            self.close()
+            if self.server.stop_on_quit:
+                self.server.running = False
+        elif command == "PWD" or command == "XPWD":
+            self.reply('257 "{}"\r\n'.format(self.cwd))
+        elif command == "CWD" or command == "XCWD":
+            try:
+                if (uos.stat(path)[0] & 0o170000) == 0o040000:
+                    self.cwd = path
+                    self.reply("250 OK\r\n")
+                else:
+                    self.reply("550 Fail\r\n")
+            except OSError:
+                self.reply("550 Fail\r\n")
+        elif command == "CDUP" or command == "XCUP":
+            self.cwd = get_absolute_path(self.cwd, "..")
+            self.reply("250 OK\r\n")
+        elif command == "PASV":
+            self._release_port()
+            self.active_addr = None
+            self.port = self.server.reserve_port(self)
+            if self.port is None:
+                self.reply("425 No data port available.\r\n")
+            else:
+                self.reply("227 Entering Passive Mode ({},{},{}).\r\n".format(
+                    self.server.addr.replace('.', ','), self.port >> 8,
+                    self.port % 256))
+        elif command == "PORT":
+            items = payload.split(",")
+            if len(items) >= 6:
+                self._release_port()
+                host = '.'.join(items[:4])
+                if host == "127.0.1.1":
+                    # replace by command session addr
+                    host = self.remote_addr
+                self.active_addr = (host, int(items[4]) * 256 + int(items[5]))
+                self.reply("200 OK\r\n")
+            else:
+                self.reply("504 Fail\r\n")
+        elif command == "REST":
+            try:
+                self.rest = int(payload)
+                self.reply("350 Restarting at {}.\r\n".format(self.rest))
+            except ValueError:
+                self.reply("501 Invalid offset.\r\n")
+        elif command == "LIST" or command == "NLST":
+            if payload.startswith("-"):
+                option = payload.split()[0].lower()
+                path = get_absolute_path(self.cwd,
+                                         payload[len(option):].lstrip())
+            else:
+                option = ""
+            self._transfer(self._list(path, command == "LIST" or
+                                      'l' in option), select.POLLOUT)
+        elif command == "RETR":
+            if _compressed(path) and not self.server.gzip:
+                self.reply("550 Compression needs MicroPython 1.21.\r\n")
+            elif self.rest and _compressed(path):
+                # A compressed stream cannot be restarted part way through
+                self.rest = 0
+                self.reply("550 Restart not supported when compressed.\r\n")
+            else:
+                self._transfer(self._retr(path, self.rest), select.POLLOUT)
+        elif command == "STOR" or command == "APPE":
+            self._transfer(self._stor(path, "wb" if command == "STOR"
+                                      else "ab"), select.POLLIN)
+        elif command == "SIZE":
+            try:
+                self.reply("213 {}\r\n".format(uos.stat(path)[6]))
+            except OSError:
+                self.reply("550 Fail\r\n")
+        elif command == "MDTM":
+            try:
+                tm = utime.localtime(uos.stat(path)[8])
+                self.reply("213 {:04d}{:02d}{:02d}{:02d}{:02d}{:02d}\r\n".
+                           format(*tm[0:6]))
+            except OSError:
+                self.reply("550 Fail\r\n")
+        elif command == "STAT":
+            if payload == "":
+                self.reply("211-Connected to ({})\r\n"
+                           "    Data address ({})\r\n"
+                           "    TYPE: Binary STRU: File MODE: Stream\r\n"
+                           "211 Client count is {}\r\n".format(
+                               self.remote_addr, self.server.addr,
+                               self.server.session_count()))
+            else:
+                self.reply("213-Directory listing:\r\n")
+                for line in _descriptions(path, True):
+                    self.reply(line)
+                self.reply("213 Done.\r\n")
+        elif command == "DELE":
+            self._file_command(uos.remove, path)
+        elif command == "RMD" or command == "XRMD":
+            self._file_command(uos.rmdir, path)
+        elif command == "MKD" or command == "XMKD":
+            self._file_command(uos.mkdir, path)
+        elif command == "RNFR":
+            try:
+                # just test if the name exists, exception if not
+                uos.stat(path)
+                self.fromname = path
+                self.reply("350 Rename from\r\n")
+            except OSError:
+                self.reply("550 Fail\r\n")
+        elif command == "RNTO":
+            if self.fromname is not None:
+                self._file_command(uos.rename, self.fromname, path)
+            else:
+                self.reply("550 Fail\r\n")
+            self.fromname = None
+        else:
+            self.reply("502 Unsupported command.\r\n")
+            self.server.log(2, "Unsupported command {} with payload {}".
+                            format(command, payload))
+
+    def _file_command(self, function, *args):
+        try:
+            function(*args)
+            self.reply("250 OK\r\n")
+        except OSError:
+            self.reply("550 Fail\r\n")
+
+    def _transfer(self, generator, mask):
+        # Start a transfer once its data connection is established
+        if self.transfer is not None or self.pending is not None:
+            self.reply("425 Transfer in progress.\r\n")
+            return
+        self.rest = 0
+        if self.data is None and self.active_addr is not None:
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.settimeout(_SEND_TIMEOUT)
+                sock.connect(self.active_addr)
+                self.server.log(1, "FTP Data connection with:",
+                                self.active_addr[0])
+                self.attach(sock)
+            except OSError:
+                sock.close()
+                self.reply("425 Can't open data connection.\r\n")
+                return
+        if self.data is not None:
+            self._begin(generator, mask)
+        elif self.port is not None:
+            self.pending = (generator, mask)
+        else:
+            self.reply("425 Use PORT or PASV first.\r\n")
+
+    def _begin(self, generator, mask):
+        self.buffer = buffers.take(config.FTP_BUFFER_BYTES)
+        self.reply("150 Opening data connection.\r\n")
+        self.transfer = generator
+        # Run up to the first wait, which also checks the file exists
+        if self._advance(0):
+            self.server.watch(self.data, mask, self._advance)
+
+    def _advance(self, event):
+        self.last = utime.ticks_ms()
+        try:
+            next(self.transfer)
+            return True
+        except StopIteration:
+            self._end("226 Transfer complete.\r\n")
+        except Exception as err:
+            self.server.log(2, "Transfer failed:", err)
+            self._end("550 Fail\r\n")
+        return False
+
+    def _end(self, text):
+        self.transfer = None
+        self._close_data()
+        self.reply(text)
+
+    def _close_data(self):
+        self._release_port()
+        self.pending = None
+        if self.buffer is not None:
+            buffers.give(self.buffer)
+            self.buffer = None
+        if self.data is not None:
+            self.server.unwatch(self.data)
+            self.data.close()
+            self.data = None
+
+    def _release_port(self):
+        if self.port is not None:
+            self.server.release_port(self.port)
+            self.port = None
+
+    def _send(self, data):
+        # Send all of data, yielding until the socket is writable each time
+        view = memoryview(data)
+        while len(view):
+            yield
+            try:
+                view = view[self.data.send(view):]
+            except OSError as err:
+                if err.args[0] != uerrno.EAGAIN:
+                    raise
+
+    def _list(self, path, full):
+        for line in _descriptions(path, full):
+            yield from self._send(line.encode())
+
+    def _retr(self, path, offset):
+        # "<file>.gz" is <file> compressed while it is sent, if there is no
+        # such file
+        if _compressed(path):
+            yield from self._retr_gzip(path[:-len(_GZIP)])
+            return
+        # "<file>.tail" is <file> from where the last tail download ended
+        tail = path.endswith(_TAIL)
+        if tail:
+            path = path[:-len(_TAIL)]
+            if not offset:
+                offset = _tail_marks.get(path, 0)
+            if offset > uos.stat(path)[6]:
+                offset = 0  # rotated since
+        view = memoryview(self.buffer)
+        with open(path, "rb") as file:
+            file.seek(offset)
+            size = file.readinto(self.buffer)
+            while size:
+                yield from self._send(view[:size])
+                offset += size
+                size = file.readinto(self.buffer)
+        if tail:
+            _tail_marks[path] = offset
+
+    def _retr_gzip(self, path):
+        import deflate
+        sink = _Sink(len(self.buffer))
+        view = memoryview(self.buffer)
+        with open(path, "rb") as file:
+            compressor = deflate.DeflateIO(sink, deflate.GZIP,
+                                           config.FTP_GZIP_WBITS)
+            size = file.readinto(self.buffer)
+            while size:
+                compressor.write(view[:size])
+                if sink.length:
+                    yield from self._send(sink.take())
+                size = file.readinto(self.buffer)
+            compressor.close()
+            yield from self._send(sink.take())
+
+    def _stor(self, path, mode):
+        view = memoryview(self.buffer)
+        with open(path, mode) as file:
+            while True:
+                yield
+                size = self.data.readinto(self.buffer)
+                if size is None:
+                    continue
+                if not size:
+                    break
+                file.write(view[:size])
+
+
+class _Sink(io.IOBase):
+    """Collects compressed output until it is sent."""
+
+    def __init__(self, size):
+        self.data = bytearray(size)
+        self.length = 0
+
+    def write(self, data):
+        end = self.length + len(data)
+        if end > len(self.data):
+            # Only when output outgrows the input chunk, rare for text
+            self.data.extend(bytearray(end - len(self.data)))
+        self.data[self.length:end] = data
+        self.length = end
+        return len(data)
+
+    def take(self):
+        # Output so far, valid until the next write
+        view = memoryview(self.data)[:self.length]
+        self.length = 0
+        return view
+
+
+def _compressed(path):
+    # True if path is a "<file>.gz" compressed as it is sent
+    return path.endswith(_GZIP) and not _exists(path)
+
+
+def _exists(path):
+    try:
+        uos.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def _interface_address():
+    # Address of the active interface, STA first
+    for interface in (network.STA_IF, network.AP_IF):
+        wlan = network.WLAN(interface)
+        if wlan.active():
+            return wlan.ifconfig()[0]
+    return None
+
+
+def _descriptions(path, full):
+    # Listing lines for a directory, or the files matching a pattern
+    try:
+        names = uos.listdir(path)
+        pattern = None
+    except OSError:  # path may be a file name or pattern
+        path, pattern = split_path(path)
+        names = uos.listdir(path)
+    for fname in sorted(names, key=str.lower):
+        if pattern is None or fncmp(fname, pattern):
+            yield _description(path, fname, full)
+
+
+def _description(path, fname, full):
+    if not full:
+        return fname + "\r\n"
+    stat = uos.stat(get_absolute_path(path, fname))
+    file_permissions = ("drwxr-xr-x"
+                        if (stat[0] & 0o170000 == 0o040000)
+                        else "-rw-r--r--")
+    file_size = stat[6]
+    try:
+        tm = utime.localtime(stat[7])
+        if tm[0] != utime.localtime()[0]:
+            when = "{} {:2} {:>5}".format(_MONTHS[tm[1]], tm[2], tm[0])
+        else:
+            when = "{} {:2} {:02}:{:02}".format(_MONTHS[tm[1]], tm[2], tm[3],
+                                                tm[4])
+    except OverflowError:
+        when = "            "
+    return "{} 1 owner group {:>10} {} {}\r\n".format(
+        file_permissions, file_size, when, fname)
+
+
+def get_absolute_path(cwd, payload):
+    # Just a few special cases "..", "." and ""
+    # If payload start's with /, set cwd to /
+    # and consider the remainder a relative path
+    if payload.startswith('/'):
+        cwd = "/"
+    for token in payload.split("/"):
+        if token == '..':
+            cwd = split_path(cwd)[0]
+        elif token != '.' and token != '':
+            if cwd == '/':
+                cwd += token
+            else:
+                cwd = cwd + '/' + token
+    return cwd
+
+
+def split_path(path):  # instead of path.rpartition('/')
+    tail = path.split('/')[-1]
+    head = path[:-(len(tail) + 1)]
+    return ('/' if head == '' else head, tail)
+
+
+# compare fname against pattern. Pattern may contain
+# the wildcards ? and *.
+def fncmp(fname, pattern):
+    pi = 0
+    si = 0
+    while pi < len(pattern) and si < len(fname):
+        if (fname[si] == pattern[pi]) or (pattern[pi] == '?'):
+            si += 1
+            pi += 1
+        else:
+            if pattern[pi] == '*':  # recurse
+                if pi == len(pattern.rstrip("*?")):  # only wildcards left
+                    return True
+                while si < len(fname):
+                    if fncmp(fname[si:], pattern[pi + 1:]):
+                        return True
+                    else:
+                        si += 1
+                return False
+            else:
+                return False
+    if pi == len(pattern.rstrip("*")) and si == len(fname):
+        return True
+    else:
+        return False
@@ -25,3 +25,82 @@ def reduce(function, iterable, initializer=None):
     for element in it:
         value = function(value, element)
     return value
+
+
+# Separates positional from keyword arguments in a cache key
+_KWD_MARK = object()
+
+
+class _LruCache:
+    # Entries are links [prev, next, key, result] in a circular list around
+    # _root, most recently used last, so a hit and an eviction are both O(1)
+
+    def __init__(self, func, maxsize):
+        self.__wrapped__ = func
+        self._maxsize = maxsize
+        self.cache_clear()
+
+    def __call__(self, *args, **kwargs):
+        key = args
+        if kwargs:
+            key += (_KWD_MARK,) + tuple(sorted(kwargs.items()))
+        root = self._root
+        link = self._cache.get(key)
+        if link is not None:
+            link_prev, link_next = link[0], link[1]
+            link_prev[1] = link_next
+            link_next[0] = link_prev
+            last = root[0]
+            last[1] = root[0] = link
+            link[0] = last
+            link[1] = root
+            self._hits += 1
+            return link[3]
+        self._misses += 1
+        result = self.__wrapped__(*args, **kwargs)
+        if self._maxsize == 0 or key in self._cache:
+            return result
+        if self._maxsize is not None and len(self._cache) >= self._maxsize:
+            oldest = root[1]
+            root[1] = oldest[1]
+            oldest[1][0] = root
+            del self._cache[oldest[2]]
+        last = root[0]
+        link = [last, root, key, result]
+        last[1] = root[0] = link
+        self._cache[key] = link
+        return result
+
+    def cache_info(self):
+        # (hits, misses, maxsize, currsize)
+        return self._hits, self._misses, self._maxsize, len(self._cache)
+
+    def cache_clear(self):
+        self._cache = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+        self._hits = 0
+        self._misses = 0
+
+
+def lru_cache(maxsize=128):
+    # Not a descriptor, so for functions rather than methods. Also used as
+    # plain @lru_cache, in which case maxsize is the function.
+    if callable(maxsize):
+        return _LruCache(maxsize, 128)
+    return lambda func: _LruCache(func, maxsize)
+
+
+class cached_property:
+    # Computed on first access then stored on the instance, which shadows
+    # this non-data descriptor from then on
+
+    def __init__(self, func):
+        self.func = func
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = self.func(instance)
+        setattr(instance, self.func.__name__, value)
+        return value
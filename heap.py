@@ -0,0 +1,66 @@
+"""Heap instrumentation and garbage collection policy per wake phase."""
+import gc
+import config
+
+_marks = []  # (phase, peak allocated, lowest free, largest free block)
+_open = []  # [phase, previous threshold, peak allocated, lowest free]
+
+
+def enter(phase):
+    """Apply the collection policy for a phase and start profiling it."""
+    threshold = config.GC_THRESHOLDS.get(phase)
+    previous = None
+    if threshold is not None:
+        previous = gc.threshold()
+        # Start the phase with a compacted heap, TLS needs large blocks
+        gc.collect()
+        gc.threshold(threshold)
+    if config.HEAP_PROFILE or previous is not None:
+        _open.append([phase, previous, gc.mem_alloc(), gc.mem_free()])
+
+
+def leave(phase):
+    """Record the heap marks of a phase and restore the previous policy."""
+    if not _open or _open[-1][0] != phase:
+        return
+    sample()
+    phase, previous, peak, low = _open.pop()
+    if config.HEAP_PROFILE:
+        _marks.append((phase, peak, low, _largest_free()))
+    if previous is not None:
+        gc.threshold(previous)
+
+
+def sample():
+    """Update the high water marks of the open phases."""
+    if config.HEAP_PROFILE:
+        alloc, free = gc.mem_alloc(), gc.mem_free()
+        for mark in _open:
+            if alloc > mark[2]:
+                mark[2] = alloc
+            if free < mark[3]:
+                mark[3] = free
+
+
+def record():
+    """Compact record of phase:peak allocated,lowest free,largest block."""
+    return ' '.join('%s:%d,%d,%d' % mark for mark in _marks)
+
+
+def reset():
+    """Discard recorded marks."""
+    del _marks[:]
+
+
+def _largest_free():
+    # Binary search by allocation, a failed allocation collects first
+    low, high = 0, gc.mem_free()
+    while low < high:
+        size = (low + high + 1) // 2
+        try:
+            block = bytearray(size)
+            del block
+            low = size
+        except MemoryError:
+            high = size - 1
+    return low
@@ -0,0 +1,84 @@
+"""Benchmark importing the wake path on the MicroPython unix port.
+
+Times the import of each module water_system.run() needs, as source (.py)
+and precompiled with mpy-cross (.mpy), with the hardware modules replaced
+by host/stubs. Needs micropython and mpy-cross on the PATH (or passed as
+options); run from anywhere with CPython:
+
+    python3 host/bench_startup.py --runs 10
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+_HOST = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HOST)
+_STUBS = os.path.join(_HOST, 'stubs')
+_PROBE = os.path.join(_HOST, 'import_probe.py')
+
+
+def probe(micropython, heapsize, module_dir):
+    """Run the import probe once, return {module: (us, heap bytes)}."""
+    out = subprocess.run(
+        [micropython, '-X', 'heapsize=' + heapsize, _PROBE, module_dir,
+         _STUBS], check=True, capture_output=True, text=True).stdout
+    results = {}
+    for line in out.splitlines():
+        name, us, alloc = line.split()
+        results[name] = (int(us), int(alloc))
+    return results
+
+
+def compile_mpy(mpy_cross, out_dir):
+    """Precompile the repository modules into out_dir."""
+    for name in sorted(os.listdir(_ROOT)):
+        if name.endswith('.py'):
+            subprocess.run(
+                [mpy_cross, '-o',
+                 os.path.join(out_dir, name[:-3] + '.mpy'),
+                 os.path.join(_ROOT, name)], check=True)
+
+
+def bench(micropython, heapsize, module_dir, runs):
+    """Median import time and heap allocated after import per module."""
+    samples = [probe(micropython, heapsize, module_dir) for _ in range(runs)]
+    return {name: (statistics.median(s[name][0] for s in samples),
+                   samples[-1][name][1])
+            for name in samples[0]}, list(samples[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--micropython', default='micropython')
+    parser.add_argument('--mpy-cross', default='mpy-cross')
+    parser.add_argument('--heapsize', default='192k',
+                        help='unix port heap, about that of the ESP32-C3')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    for tool in (args.micropython, args.mpy_cross):
+        if shutil.which(tool) is None:
+            sys.exit('%s not found' % tool)
+
+    with tempfile.TemporaryDirectory() as mpy_dir:
+        compile_mpy(args.mpy_cross, mpy_dir)
+        py, names = bench(args.micropython, args.heapsize, _ROOT, args.runs)
+        mpy, _ = bench(args.micropython, args.heapsize, mpy_dir, args.runs)
+
+    print('%-14s %10s %10s %12s %12s' % ('module', 'py us', 'mpy us',
+                                         'py heap', 'mpy heap'))
+    for name in names:
+        print('%-14s %10d %10d %12d %12d' % (name, py[name][0], mpy[name][0],
+                                             py[name][1], mpy[name][1]))
+    print('%-14s %10d %10d %12d %12d' % (
+        'total', sum(v[0] for v in py.values()),
+        sum(v[0] for v in mpy.values()),
+        py[names[-1]][1], mpy[names[-1]][1]))
+
+
+if __name__ == '__main__':
+    main()
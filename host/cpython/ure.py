@@ -0,0 +1,34 @@
+"""CPython stand-in for the MicroPython ure module.
+
+MicroPython applies str patterns to bytes, so patterns are compiled for
+whichever type they are used with.
+"""
+import re
+
+
+class _Pattern:
+    def __init__(self, pattern):
+        self._str = re.compile(pattern)
+        self._bytes = re.compile(pattern.encode())
+
+    def _for(self, string):
+        return self._bytes if isinstance(string, (bytes, bytearray)) \
+            else self._str
+
+    def search(self, string):
+        return self._for(string).search(string)
+
+    def match(self, string):
+        return self._for(string).match(string)
+
+
+def compile(pattern, flags=0):
+    return _Pattern(pattern)
+
+
+def search(pattern, string):
+    return compile(pattern).search(string)
+
+
+def match(pattern, string):
+    return compile(pattern).match(string)
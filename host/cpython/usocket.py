@@ -0,0 +1,85 @@
+"""CPython stand-in for the MicroPython usocket module.
+
+Requests are served in process by the services registered by the
+simulator, with their latency added to the virtual clock in utime.
+"""
+import utime
+
+AF_INET = 2
+SOCK_STREAM = 1
+
+# Host name: service object with a respond(host, request) method returning
+# the response bytes, and dns_ms, connect_ms, first_byte_ms, kbytes_per_s
+# and fail_connect attributes
+services = {}
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    service = services.get(host)
+    if service is None:
+        raise OSError(-202)  # Name resolution failed
+    utime.sleep_ms(service.dns_ms)
+    return [(AF_INET, SOCK_STREAM, 0, '', (host, port))]
+
+
+class socket:
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=0):
+        self._service = None
+        self._request = b''
+        self._response = None
+        self._pos = 0
+
+    def connect(self, address):
+        host = address[0]
+        service = services[host]
+        utime.sleep_ms(service.connect_ms)
+        if service.fail_connect():
+            raise OSError(104)  # ECONNRESET
+        self._host = host
+        self._service = service
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self._request += bytes(data)
+        return len(data)
+
+    send = write
+    sendall = write
+
+    def _respond(self):
+        if self._response is None:
+            utime.sleep_ms(self._service.first_byte_ms)
+            self._response = self._service.respond(self._host, self._request)
+
+    def _take(self, n):
+        data = self._response[self._pos:self._pos + n]
+        self._pos += len(data)
+        utime.sleep_us(len(data) * 1000 // self._service.kbytes_per_s)
+        return data
+
+    def readline(self):
+        self._respond()
+        end = self._response.find(b'\n', self._pos)
+        n = (len(self._response) if end < 0 else end + 1) - self._pos
+        return self._take(n)
+
+    def read(self, n=-1):
+        self._respond()
+        if n < 0:
+            n = len(self._response) - self._pos
+        return self._take(n)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
+    def settimeout(self, timeout):
+        pass
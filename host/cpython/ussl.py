@@ -0,0 +1,8 @@
+"""CPython stand-in for the MicroPython ussl module."""
+import utime
+import usocket
+
+
+def wrap_socket(sock, server_hostname=None, **kwargs):
+    utime.sleep_ms(usocket.services[server_hostname].tls_ms)
+    return sock
@@ -0,0 +1,75 @@
+"""CPython stand-in for the MicroPython utime module, with a virtual clock.
+
+Ticks count from the simulated boot: real elapsed time, multiplied by
+cpu_scale to approximate the slower device, plus simulated delays. Sleeps
+and injected latencies advance the clock without waiting. Times are
+seconds since 2000-01-01 GMT, the MicroPython epoch.
+"""
+import calendar
+import time as _time
+
+_EPOCH_OFFSET = 946684800  # 1970 to 2000
+
+cpu_scale = 1.0
+_boot = _time.perf_counter()
+_delay_us = 0
+# Seconds since 2000 at boot
+_wall = 0
+
+
+def boot(wall_seconds):
+    """Start a new wake at wall_seconds since 2000, resetting ticks."""
+    global _boot, _delay_us, _wall
+    _boot = _time.perf_counter()
+    _delay_us = 0
+    _wall = wall_seconds
+
+
+def advance_us(us):
+    """Advance the clock by a simulated delay."""
+    global _delay_us
+    _delay_us += int(us)
+
+
+def ticks_us():
+    real = (_time.perf_counter() - _boot) * 1000000 * cpu_scale
+    return int(real) + _delay_us
+
+
+def ticks_ms():
+    return ticks_us() // 1000
+
+
+def ticks_diff(end, start):
+    return end - start
+
+
+def sleep(secs):
+    advance_us(secs * 1000000)
+
+
+def sleep_ms(ms):
+    advance_us(ms * 1000)
+
+
+def sleep_us(us):
+    advance_us(us)
+
+
+def time():
+    return _wall + ticks_us() // 1000000
+
+
+def mktime(t):
+    return calendar.timegm(tuple(t[:6]) + (0, 0, 0)) - _EPOCH_OFFSET
+
+
+def localtime(secs=None):
+    if secs is None:
+        secs = time()
+    t = _time.gmtime(secs + _EPOCH_OFFSET)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec,
+            t.tm_wday, t.tm_yday)
+
+
+gmtime = localtime
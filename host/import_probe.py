@@ -0,0 +1,36 @@
+"""Time importing the wake path modules, run by bench_startup.py.
+
+Runs on the MicroPython unix port:
+
+    micropython host/import_probe.py <module dir> <stubs dir>
+
+Prints one line per module: name, import time in microseconds and heap
+allocated after the import, in bytes.
+"""
+import sys
+import gc
+import utime
+
+# In the order water_system.run() first needs them, leaves first so each
+# time is mostly the module itself
+MODULES = (
+    'config', 'buffers', 'heap', 'timing', 'energy', 'events', 'state',
+    'logging', 'functools', 'clock', 'file_logger', 'battery', 'rain_gauge',
+    'watcher', 'wifi', 'water_system',
+    # Imported once WiFi has connected
+    'retrier', 'requests', 'weather', 'thingspeak',
+)
+
+
+def main(module_dir, stubs_dir):
+    sys.path.insert(0, module_dir)
+    sys.path.insert(0, stubs_dir)
+    gc.collect()
+    for name in MODULES:
+        start = utime.ticks_us()
+        __import__(name)
+        us = utime.ticks_diff(utime.ticks_us(), start)
+        print(name, us, gc.mem_alloc())
+
+
+main(sys.argv[1], sys.argv[2])
@@ -0,0 +1,66 @@
+"""Decode the binary structured event log on the host.
+
+Copy the events file from the device (see README), then:
+
+    python3 host/log_decode.py system.evt
+    python3 host/log_decode.py --csv --hours 13 system.evt system.evt.1
+
+Runs under CPython, the record layout and templates are shared with the
+device through events.py.
+"""
+import argparse
+import csv
+import datetime
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import events  # noqa: E402
+
+_EPOCH = datetime.datetime(2000, 1, 1)
+
+
+def records(path):
+    """Yield (seconds, event id, args) tuples from an events file."""
+    with open(path, 'rb') as file:
+        while True:
+            data = file.read(events.RECORD_SIZE)
+            if len(data) < events.RECORD_SIZE:
+                return
+            secs, event_id, *args = struct.unpack(events.RECORD, data)
+            yield secs, event_id, args
+
+
+def timestamp(secs, hours=0):
+    """Format record seconds as DD-MM-YYYY HH24:MM:SS, as the text log."""
+    dt = _EPOCH + datetime.timedelta(seconds=secs, hours=hours)
+    return dt.strftime('%d-%m-%Y %H:%M:%S')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='+',
+                        help='events files, oldest segment last')
+    parser.add_argument('--csv', action='store_true',
+                        help='write CSV instead of text')
+    parser.add_argument('--hours', type=int, default=0,
+                        help='hours ahead of GMT (HOURS_DIFF_FROM_GMT)')
+    args = parser.parse_args(argv)
+
+    writer = csv.writer(sys.stdout) if args.csv else None
+    if writer:
+        writer.writerow(('time', 'event', 'message', 'arg1', 'arg2', 'arg3'))
+    # Segments are named newest first, output oldest first
+    for path in reversed(args.files):
+        for secs, event_id, values in records(path):
+            when = timestamp(secs, args.hours)
+            text = events.to_text(event_id, values)
+            if writer:
+                writer.writerow([when, event_id, text] + values)
+            else:
+                print('%s - %s' % (when, text))
+
+
+if __name__ == '__main__':
+    main()
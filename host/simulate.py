@@ -0,0 +1,439 @@
+"""Simulate complete wakes of the water system on the host.
+
+Runs boot.py and main.py under CPython, with host/stubs standing in for the
+hardware and host/cpython for the MicroPython built-ins, including a
+virtual clock and in process stand-ins for the ECAN, met.no and ThingSpeak
+services. Network latency, WiFi association and retry delays are added to
+the virtual clock, so wakes run quickly while reporting the time they would
+take. RTC memory and the files written survive from one wake to the next.
+
+    python3 host/simulate.py --wakes 3
+    python3 host/simulate.py --fail ecan=2 --latency metno=900 --wifi-ms 4000
+    python3 host/simulate.py --rain-today 6 --forecast-today 12 -v
+    python3 host/simulate.py --gauge-pin 1 --tips 20 --wakes 2
+"""
+import argparse
+import binascii
+import collections
+import contextlib
+import gc as _gc
+import importlib
+import io
+import os
+import struct
+import sys
+import tempfile
+import traceback
+import types
+
+_HOST = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HOST)
+sys.path[0:0] = [os.path.join(_HOST, 'cpython'), os.path.join(_HOST, 'stubs'),
+                 _ROOT]
+
+
+def _install_builtins():
+    """Provide the MicroPython built-in modules CPython lacks."""
+    for name, module in (('ustruct', struct), ('ubinascii', binascii),
+                         ('uos', os), ('ucollections', collections)):
+        sys.modules[name] = module
+
+    gc = types.ModuleType('gc')
+    gc.collect = _gc.collect
+    gc.heap_size = 192 * 1024
+    gc.threshold_value = -1
+
+    def threshold(amount=None):
+        if amount is None:
+            return gc.threshold_value
+        gc.threshold_value = amount
+
+    gc.threshold = threshold
+    # CPython has no comparable heap, report it as empty
+    gc.mem_alloc = lambda: 0
+    gc.mem_free = lambda: gc.heap_size
+    sys.modules['gc'] = gc
+
+    def print_exception(exc, file=sys.stdout):
+        traceback.print_exception(type(exc), exc, exc.__traceback__,
+                                  file=file)
+
+    sys.print_exception = print_exception
+
+
+_install_builtins()
+
+import esp32  # noqa: E402
+import machine  # noqa: E402
+import network  # noqa: E402
+import urtc  # noqa: E402
+import usocket  # noqa: E402
+import utime  # noqa: E402
+
+_SECS_IN_HOUR = 3600
+_SECS_IN_DAY = 24 * _SECS_IN_HOUR
+
+
+class Service:
+    """HTTP service stand-in with scripted latency and failures.
+
+    Subclasses define body(path, now), returning the response content.
+    """
+
+    def __init__(self, name, first_byte_ms, tls_ms=0, dns_ms=40,
+                 connect_ms=60, kbytes_per_s=40):
+        self.name = name
+        self.first_byte_ms = first_byte_ms
+        self.tls_ms = tls_ms
+        self.dns_ms = dns_ms
+        self.connect_ms = connect_ms
+        self.kbytes_per_s = kbytes_per_s
+        # First fail requests of each wake fail with fail_status, 0 for a
+        # connection reset
+        self.fail = 0
+        self.fail_status = 503
+        self.requests = 0
+        self.scenario = None
+
+    def fail_connect(self):
+        self.requests += 1
+        return self.requests <= self.fail and self.fail_status == 0
+
+    def respond(self, host, request):
+        now = utime.time()
+        if self.requests <= self.fail:
+            return _response(self.fail_status, now, b'Service unavailable')
+        path = request.split(b' ', 2)[1].decode()
+        return _response(200, now, self.body(path, now))
+
+
+class Ecan(Service):
+    """Rainfall for the last two days as CSV, in NZ time."""
+
+    def body(self, path, now):
+        local = now + self.scenario.hours_diff * _SECS_IN_HOUR
+        start_of_today = local - local % _SECS_IN_DAY
+        hours_today = (local - start_of_today) // _SECS_IN_HOUR + 1
+        lines = [b'Site No,Date Time,Rainfall (mm)']
+        for hour in range(-24, hours_today):
+            t = utime.localtime(start_of_today + hour * _SECS_IN_HOUR)
+            mm = self.scenario.rain_today / hours_today if hour >= 0 else 0.0
+            lines.append(b'326512,%02d/%02d/%04d %02d:00,%.1f' % (
+                t[2], t[1], t[0], t[3], mm))
+        return b'\r\n'.join(lines) + b'\r\n'
+
+
+class MetNo(Service):
+    """Hourly forecast in the met.no compact JSON format, in UTC."""
+
+    def body(self, path, now):
+        local = now + self.scenario.hours_diff * _SECS_IN_HOUR
+        today = _date(local)
+        tomorrow = _date(local + _SECS_IN_DAY)
+        start = now - now % _SECS_IN_HOUR
+        times = [start + hour * _SECS_IN_HOUR for hour in range(72)]
+        # The firmware buckets each entry by its GMT date against the local
+        # date, so entries dated local today or tomorrow in GMT carry them
+        dates = [_date(t) for t in times]
+        tenths = {today: round(self.scenario.forecast_today * 10),
+                  tomorrow: round(self.scenario.forecast_tomorrow * 10)}
+        series = []
+        for hour, (t, date) in enumerate(zip(times, dates)):
+            # Spread the tenths so the entries add up to the amount exactly
+            total, count = tenths.get(date, 0), dates.count(date)
+            share = total // count + (hour - dates.index(date) < total % count)
+            series.append(_FORECAST_ENTRY % (
+                date, utime.localtime(t)[3], share / 10))
+        return (b'{"type":"Feature","geometry":{"type":"Point","coordinates":'
+                b'[172.6,-43.5,20]},"properties":{"meta":{"updated_at":"%sT00:'
+                b'00:00Z","units":{"precipitation_amount":"mm"}},"timeseries":'
+                b'[' % today + b','.join(series) + b']}}')
+
+
+_FORECAST_ENTRY = (
+    b'{"time":"%sT%02d:00:00Z","data":{"instant":{"details":{'
+    b'"air_pressure_at_sea_level":1012.3,"air_temperature":15.2,'
+    b'"cloud_area_fraction":100.0,"relative_humidity":85.1,'
+    b'"wind_from_direction":220.5,"wind_speed":3.4}},"next_12_hours":{'
+    b'"summary":{"symbol_code":"cloudy"}},"next_1_hours":{"summary":{'
+    b'"symbol_code":"rain"},"details":{"precipitation_amount":%.1f}},'
+    b'"next_6_hours":{"summary":{"symbol_code":"cloudy"},"details":{'
+    b'"precipitation_amount":0.0}}}}')
+
+
+class ThingSpeak(Service):
+    """Channel update, returns the new entry."""
+
+    def body(self, path, now):
+        self.scenario.uploads.append(path)
+        return b'{"channel_id":1,"entry_id":%d}' % len(self.scenario.uploads)
+
+
+def _date(secs):
+    t = utime.localtime(secs)
+    return b'%04d-%02d-%02d' % (t[0], t[1], t[2])
+
+
+def _response(status, now, body):
+    date = utime.localtime(now)
+    return (b'HTTP/1.1 %d %s\r\nContent-Type: text/plain\r\n'
+            b'Content-Length: %d\r\nDate: %s, %02d %s %04d %02d:%02d:%02d GMT'
+            b'\r\nConnection: close\r\n\r\n' % (
+                status, b'OK' if status == 200 else b'Error', len(body),
+                _DAYS[date[6]], date[2], _MONTHS[date[1] - 1], date[0],
+                date[3], date[4], date[5]) + body)
+
+
+_DAYS = (b'Mon', b'Tue', b'Wed', b'Thu', b'Fri', b'Sat', b'Sun')
+_MONTHS = (b'Jan', b'Feb', b'Mar', b'Apr', b'May', b'Jun', b'Jul', b'Aug',
+           b'Sep', b'Oct', b'Nov', b'Dec')
+
+
+def _next_alarm(after, alarm):
+    """Seconds of the first time after which matches the DS3231 alarm."""
+    # Fields below the most significant one set match from zero
+    fields = [alarm.hour, alarm.minute, alarm.second]
+    for i in range(1, 3):
+        if fields[i] is None and fields[i - 1] is not None:
+            fields[i] = 0
+    t = after + 1
+    for _ in range(3 * _SECS_IN_DAY):
+        tm = utime.localtime(t)
+        if all(field is None or field == tm[3 + i]
+               for i, field in enumerate(fields)):
+            return t
+        t += 1
+    raise ValueError('Alarm never matches: %r' % (alarm,))
+
+
+def _purge_modules():
+    """Forget the project modules, as a deep sleep loses RAM."""
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None) or ''
+        if os.path.dirname(os.path.abspath(path)) == _ROOT:
+            del sys.modules[name]
+
+
+def _run_file(name):
+    path = os.path.join(_ROOT, name)
+    with open(path) as file:
+        code = compile(file.read(), path, 'exec')
+    exec(code, {'__name__': '__main__', '__file__': path})
+
+
+def _configure(scenario):
+    """Apply the scenario's settings to a freshly imported config."""
+    config = importlib.import_module('config')
+    if scenario.gauge_pin is not None:
+        config.RAIN_GAUGE_PIN = scenario.gauge_pin
+    if scenario.text_log:
+        config.LOG_STRUCTURED = False
+    return config
+
+
+def tip(scenario, when):
+    """Run a wake from a rain gauge tip at when, returning ms awake."""
+    _purge_modules()
+    config = _configure(scenario)
+    utime.boot(when)
+    # The DS3231 alarm is not active, the switch has opened again
+    machine.pin_values[config.WAKEUP_PIN] = 1
+    machine.pin_values[config.RAIN_GAUGE_PIN] = 1
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            _run_file('boot.py')
+            _run_file('main.py')
+        raise RuntimeError('Tip wake did not sleep')
+    except machine.DeepSleep:
+        pass
+    finally:
+        machine.pin_values[config.WAKEUP_PIN] = 0
+    return utime.ticks_ms()
+
+
+def wake(scenario, number):
+    """Run one wake, returning a dict describing it."""
+    _purge_modules()
+    _configure(scenario)
+    for service in scenario.services.values():
+        service.requests = 0
+    network.connect_delay_ms = (None if number < scenario.wifi_fail
+                                else scenario.wifi_ms)
+    machine.wake = machine.EXT1_WAKE
+    started = scenario.wall
+    utime.boot(started)
+
+    output = io.StringIO()
+    slept = False
+    with contextlib.redirect_stdout(output):
+        try:
+            _run_file('boot.py')
+            _run_file('main.py')
+        except machine.DeepSleep:
+            slept = True
+    awake_ms = utime.ticks_ms()
+
+    timing = sys.modules['timing']
+    state = sys.modules['state']
+    phases = collections.OrderedDict()
+    for name, us in timing._spans:
+        phases[name] = phases.get(name, 0) + us / 1000
+    if slept:
+        scenario.wall = _next_alarm(started + awake_ms // 1000,
+                                    urtc.alarms[1])
+    return {
+        'number': number,
+        'started': started,
+        'awake_ms': awake_ms,
+        'phases': phases,
+        'requests': {name: service.requests
+                     for name, service in scenario.services.items()},
+        'relay': state.get('relay'),
+        'uah': state.get('wake_uah'),
+        'slept': slept,
+        'output': output.getvalue(),
+    }
+
+
+def _timestamp(secs, hours_diff):
+    t = utime.localtime(secs + hours_diff * _SECS_IN_HOUR)
+    return '%02d-%02d-%04d %02d:%02d:%02d' % (t[2], t[1], t[0], t[3], t[4],
+                                              t[5])
+
+
+def report(results, scenario, verbose):
+    for r in results:
+        retries = sum(max(n - 1, 0) for n in r['requests'].values())
+        print('Wake %d at %s: awake %d ms, %d uAh, requests %s, '
+              'retries %d, relay %s%s' % (
+                  r['number'] + 1, _timestamp(r['started'],
+                                              scenario.hours_diff),
+                  r['awake_ms'], r['uah'],
+                  ' '.join('%s=%d' % item for item in r['requests'].items()),
+                  retries, {-1: 'unknown', 0: 'OFF', 1: 'ON'}[r['relay']],
+                  '' if r['slept'] else ', did not sleep'))
+        if verbose:
+            print('  ' + ' '.join('%s=%.0f' % item
+                                  for item in r['phases'].items()))
+            for line in r['output'].splitlines():
+                print('  > ' + line)
+
+    print('\n%-24s %10s %10s' % ('phase', 'mean ms', 'max ms'))
+    names = []
+    for r in results:
+        names.extend(n for n in r['phases'] if n not in names)
+    for name in names:
+        values = [r['phases'].get(name, 0) for r in results]
+        print('%-24s %10.0f %10.0f' % (name, sum(values) / len(values),
+                                        max(values)))
+    awake = [r['awake_ms'] for r in results]
+    print('%-24s %10.0f %10.0f' % ('awake', sum(awake) / len(awake),
+                                    max(awake)))
+    if scenario.tip_ms:
+        print('%-24s %10.0f %10.0f' % (
+            'tip awake (%d)' % len(scenario.tip_ms),
+            sum(scenario.tip_ms) / len(scenario.tip_ms), max(scenario.tip_ms)))
+
+
+def _service_options(values, option):
+    result = {}
+    for value in values or ():
+        try:
+            name, setting = value.split('=')
+            result[name] = setting
+        except ValueError:
+            sys.exit('%s expects service=value, got %s' % (option, value))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        epilog='Services are ecan, metno and thingspeak.')
+    parser.add_argument('--wakes', type=int, default=3)
+    parser.add_argument('--start', default='2026-10-19 05:00:00',
+                        help='GMT time of the first wake')
+    parser.add_argument('--hours-diff', type=int, default=13,
+                        help='hours ahead of GMT, as in config.py')
+    parser.add_argument('--rain-today', type=float, default=0.0)
+    parser.add_argument('--forecast-today', type=float, default=0.0)
+    parser.add_argument('--forecast-tomorrow', type=float, default=0.0)
+    parser.add_argument('--wifi-ms', type=int, default=1500,
+                        help='WiFi association time')
+    parser.add_argument('--wifi-fail', type=int, default=0,
+                        help='number of wakes WiFi does not connect')
+    parser.add_argument('--latency', action='append', metavar='SERVICE=MS',
+                        help='time to first byte of a service')
+    parser.add_argument('--fail', action='append',
+                        metavar='SERVICE=N[:STATUS]',
+                        help='fail the first N requests of each wake with '
+                             'HTTP STATUS (default 503, 0 resets the '
+                             'connection)')
+    parser.add_argument('--rtc-drift', type=int, default=0,
+                        help='seconds the DS3231 is ahead at the start')
+    parser.add_argument('--gauge-pin', type=int,
+                        help='fit a rain gauge on this GPIO')
+    parser.add_argument('--tips', type=int, default=0,
+                        help='rain gauge tips between consecutive wakes')
+    parser.add_argument('--text-log', action='store_true',
+                        help='log text, as LOG_STRUCTURED = False')
+    parser.add_argument('--cpu-scale', type=float, default=1.0,
+                        help='device time per unit of host CPU time')
+    parser.add_argument('--dir', help='keep device files in this directory')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    utime.cpu_scale = args.cpu_scale
+    urtc.offset = args.rtc_drift
+
+    scenario = types.SimpleNamespace(
+        hours_diff=args.hours_diff, rain_today=args.rain_today,
+        forecast_today=args.forecast_today,
+        forecast_tomorrow=args.forecast_tomorrow, wifi_ms=args.wifi_ms,
+        wifi_fail=args.wifi_fail, uploads=[], gauge_pin=args.gauge_pin,
+        tip_ms=[], text_log=args.text_log,
+        wall=utime.mktime([int(v) for v in args.start.replace(
+            '-', ' ').replace(':', ' ').split()]))
+    scenario.services = collections.OrderedDict((
+        ('ecan', Ecan('ecan', first_byte_ms=300)),
+        ('metno', MetNo('metno', first_byte_ms=400, tls_ms=900)),
+        ('thingspeak', ThingSpeak('thingspeak', first_byte_ms=350,
+                                  tls_ms=900)),
+    ))
+    hosts = {'ecan': 'data.ecan.govt.nz', 'metno': 'api.met.no',
+             'thingspeak': 'api.thingspeak.com'}
+    for name, service in scenario.services.items():
+        service.scenario = scenario
+        usocket.services[hosts[name]] = service
+    for name, ms in _service_options(args.latency, '--latency').items():
+        scenario.services[name].first_byte_ms = int(ms)
+    for name, fail in _service_options(args.fail, '--fail').items():
+        count, _, status = fail.partition(':')
+        scenario.services[name].fail = int(count)
+        scenario.services[name].fail_status = int(status or 503)
+
+    with contextlib.ExitStack() as stack:
+        directory = args.dir or stack.enter_context(
+            tempfile.TemporaryDirectory())
+        os.makedirs(directory, exist_ok=True)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        stack.callback(os.chdir, cwd)
+        results = []
+        for number in range(args.wakes):
+            if number and args.gauge_pin is not None:
+                # Spread the tips over the second half of the sleep
+                last = results[-1]
+                asleep = (last['started'] + last['awake_ms'] // 1000,
+                          scenario.wall)
+                for i in reversed(range(args.tips)):
+                    scenario.tip_ms.append(tip(scenario, asleep[1] - (
+                        asleep[1] - asleep[0]) * (i + 1) // (2 * args.tips)))
+            results.append(wake(scenario, number))
+            if not results[-1]['slept']:
+                break
+        report(results, scenario, args.verbose)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+"""Host stand-in for the MicroPython esp32 module."""
+WAKEUP_ALL_LOW = False
+WAKEUP_ANY_HIGH = True
+
+wake_pins = ()
+
+
+def wake_on_ext1(pins, level):
+    global wake_pins
+    wake_pins = pins
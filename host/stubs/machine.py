@@ -0,0 +1,86 @@
+"""Host stand-in for the MicroPython machine module."""
+import utime
+
+DEEPSLEEP_RESET = 4
+PWRON_RESET = 1
+EXT1_WAKE = 3
+TIMER_WAKE = 4
+
+# Scripted by the host harness
+adc_uv = 850000
+pin_values = {}
+wake = EXT1_WAKE
+_rtc_memory = b''
+# Seconds the ESP32 RTC is ahead of the virtual clock
+_rtc_offset = 0
+
+
+class DeepSleep(Exception):
+    """Raised by deepsleep(), ends a simulated wake."""
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=None, pull=None, value=None):
+        self.id = id
+        if value is not None:
+            pin_values[id] = value
+
+    def value(self, value=None):
+        if value is None:
+            return pin_values.get(self.id, 0)
+        pin_values[self.id] = value
+
+
+class ADC:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def read_uv(self):
+        return adc_uv
+
+
+class SoftI2C:
+    def __init__(self, sda=None, scl=None, freq=400000):
+        pass
+
+
+class RTC:
+    def datetime(self, datetimetuple=None):
+        global _rtc_offset
+        if datetimetuple is None:
+            t = utime.localtime(utime.time() + _rtc_offset)
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+        year, month, day, weekday, hour, minute, second = datetimetuple[:7]
+        _rtc_offset = (utime.mktime((year, month, day, hour, minute, second))
+                       - utime.time())
+
+    def memory(self, data=None):
+        global _rtc_memory
+        if data is None:
+            return _rtc_memory
+        _rtc_memory = bytes(data)
+
+
+class WDT:
+    def __init__(self, timeout=5000):
+        pass
+
+    def feed(self):
+        pass
+
+
+def wake_reason():
+    return wake
+
+
+def reset_cause():
+    return DEEPSLEEP_RESET
+
+
+def deepsleep(ms=0):
+    raise DeepSleep()
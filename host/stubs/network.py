@@ -0,0 +1,38 @@
+"""Host stand-in for the MicroPython network module."""
+import utime
+
+STA_IF = 0
+AP_IF = 1
+
+# Scripted by the host harness, None never connects
+connect_delay_ms = 1500
+
+
+class WLAN:
+    _active = [False, False]
+    _connect_start = None
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return WLAN._active[self.interface]
+        WLAN._active[self.interface] = is_active
+        if not is_active:
+            WLAN._connect_start = None
+
+    def connect(self, ssid=None, key=None):
+        WLAN._connect_start = utime.ticks_ms()
+
+    def disconnect(self):
+        WLAN._connect_start = None
+
+    def isconnected(self):
+        if WLAN._connect_start is None or connect_delay_ms is None:
+            return False
+        elapsed = utime.ticks_diff(utime.ticks_ms(), WLAN._connect_start)
+        return elapsed >= connect_delay_ms
+
+    def ifconfig(self):
+        return ('192.168.1.50', '255.255.255.0', '192.168.1.1', '8.8.8.8')
@@ -0,0 +1,5 @@
+"""Host stand-in for the MicroPython ntptime module."""
+
+
+def settime():
+    pass
@@ -0,0 +1,7 @@
+"""Host stand-in secrets, see README."""
+WIFI_SSID = 'ssid'
+WIFI_PASSPHRASE = 'passphrase'
+THINGSPEAK_API_KEY = 'key'
+
+HEADER = {'User-Agent': 'water-system-host'}
+LOCATION = 'lat=-43.500&lon=172.600'
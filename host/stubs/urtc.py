@@ -0,0 +1,53 @@
+"""Host stand-in for the urtc library, with a DS3231 running from utime."""
+import utime
+from ucollections import namedtuple
+
+DateTimeTuple = namedtuple("DateTimeTuple", ["year", "month", "day",
+                           "weekday", "hour", "minute", "second",
+                           "millisecond"])
+
+# Seconds the virtual DS3231 is ahead of utime.time(), set by the harness
+offset = 0
+# Alarm number: alarm time tuple, as last configured
+alarms = {}
+
+
+def datetime_tuple(year=None, month=None, day=None, weekday=None, hour=None,
+                   minute=None, second=None, millisecond=None):
+    return DateTimeTuple(year, month, day, weekday, hour, minute, second,
+                         millisecond)
+
+
+def tuple2seconds(datetime):
+    return utime.mktime((datetime.year, datetime.month, datetime.day,
+                         datetime.hour, datetime.minute, datetime.second,
+                         datetime.weekday, 0))
+
+
+def seconds2tuple(seconds):
+    (year, month, day, hour, minute, second, weekday,
+     _yday) = utime.localtime(seconds)[:8]
+    return DateTimeTuple(year, month, day, weekday, hour, minute, second, 0)
+
+
+class DS3231:
+    def __init__(self, i2c, address=0x68):
+        pass
+
+    def datetime(self, datetime=None):
+        global offset
+        if datetime is None:
+            return seconds2tuple(int(utime.time()) + offset)
+        secs = tuple2seconds(datetime_tuple(*datetime))
+        offset = secs - int(utime.time())
+
+    def alarm(self, value=None, alarm=0):
+        return False
+
+    def interrupt(self, alarm=0):
+        pass
+
+    def alarm_time(self, datetime=None, alarm=0):
+        if datetime is None:
+            return alarms.get(alarm)
+        alarms[alarm] = datetime
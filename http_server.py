@@ -0,0 +1,131 @@
+"""Diagnostics HTTP server.
+
+Serves /status as JSON and /log, the system log, with support for a single
+byte Range so a client can fetch only what was added since its last request.
+The log is streamed from flash through a buffer borrowed from the pool,
+followed by the records still staged in RTC memory, so a request does not
+write flash.
+"""
+import uasyncio
+import ujson
+import uos
+import buffers
+import config
+import state
+
+
+async def serve(status, port=None):
+    """Serve requests until cancelled.
+
+    Args:
+        status: Function returning the /status content as a dict.
+        port: Port to listen on, config.HTTP_PORT by default.
+    """
+    server = await uasyncio.start_server(
+        lambda reader, writer: _handle(status, reader, writer),
+        '0.0.0.0', port or config.HTTP_PORT)
+    await server.wait_closed()
+
+
+async def _handle(status, reader, writer):
+    try:
+        request = (await reader.readline()).split()
+        byte_range = None
+        while True:
+            line = await reader.readline()
+            if not line or line == b'\r\n':
+                break
+            if line[:6].lower() == b'range:':
+                byte_range = line[6:].strip().decode()
+        if len(request) < 2 or request[0] != b'GET':
+            await _respond(writer, '405 Method Not Allowed')
+        elif request[1] == b'/status':
+            await _respond(writer, '200 OK', ujson.dumps(status()),
+                           'application/json')
+        elif request[1] == b'/log':
+            await _send_log(writer, byte_range)
+        else:
+            await _respond(writer, '404 Not Found')
+    except OSError:
+        pass  # client went away
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def _respond(writer, status, body='', content_type='text/plain',
+                   extra=''):
+    writer.write('HTTP/1.0 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n'
+                 '{}\r\n'.format(status, content_type, len(body), extra))
+    writer.write(body)
+    await writer.drain()
+
+
+async def _send_log(writer, byte_range):
+    with buffers.borrow(config.HTTP_BUFFER_BYTES) as buffer:
+        # Text records staged in RTC memory follow those in the file, in
+        # structured mode they are events for another file
+        staged = b''
+        if config.LOG_BUFFER_BYTES > 0 and not config.LOG_STRUCTURED:
+            staged = state.log()
+        try:
+            file_size = uos.stat(config.LOG_FILE)[6]
+        except OSError:
+            file_size = 0
+        size = file_size + len(staged)
+        requested = _parse_range(byte_range, size)
+        if requested is None:
+            start, end = 0, size - 1
+            writer.write('HTTP/1.0 200 OK\r\n')
+        elif requested[0] > requested[1]:
+            await _respond(writer, '416 Range Not Satisfiable',
+                           extra='Content-Range: bytes */{}\r\n'.format(size))
+            return
+        else:
+            start, end = requested
+            writer.write('HTTP/1.0 206 Partial Content\r\n'
+                         'Content-Range: bytes {}-{}/{}\r\n'.format(
+                             start, end, size))
+        remaining = end - start + 1
+        writer.write('Content-Type: text/plain\r\nContent-Length: {}\r\n'
+                     'Accept-Ranges: bytes\r\n\r\n'.format(remaining))
+        if not remaining:
+            await writer.drain()
+            return
+        view = memoryview(buffer)
+        from_file = max(min(end + 1, file_size) - start, 0)
+        if from_file:
+            with open(config.LOG_FILE, 'rb') as file:
+                file.seek(start)
+                while from_file:
+                    count = file.readinto(view[:min(from_file, len(view))])
+                    if not count:
+                        break
+                    writer.write(view[:count])
+                    await writer.drain()
+                    from_file -= count
+                    remaining -= count
+        if remaining:
+            offset = max(start - file_size, 0)
+            writer.write(memoryview(staged)[offset:offset + remaining])
+            await writer.drain()
+
+
+def _parse_range(header, size):
+    # Inclusive (start, end) of a single "bytes=" range, None if there is no
+    # usable range so the whole file is sent
+    if header is None or not header.startswith('bytes=') or ',' in header:
+        return None
+    try:
+        first, last = header[6:].split('-', 1)
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None  # invalid, rather than unsatisfiable
+        else:
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    return start, min(end, size - 1)
@@ -16,6 +16,7 @@ _level_dict = {
 }
 
 _stream = sys.stderr
+_timesource = None
 
 class Logger:
 
@@ -39,10 +40,17 @@ class Logger:
     def log(self, level, msg, *args):
         if level >= (self.level or _level):
             _stream.write("%s:%s:" % (self._level_str(level), self.name))
+            if _timesource is not None:
+                # Only read the time source for records actually emitted
+                _stream.write(_timesource())
+                _stream.write(" - ")
             if not args:
                 print(msg, file=_stream)
             else:
                 print(msg % args, file=_stream)
+            if level >= ERROR and hasattr(_stream, "flush"):
+                # Don't let buffered streams lose records on error
+                _stream.flush()
 
     def debug(self, msg, *args):
         self.log(DEBUG, msg, *args)
@@ -60,8 +68,9 @@ class Logger:
         self.log(CRITICAL, msg, *args)
 
     def exc(self, e, msg, *args):
-        self.log(ERROR, msg, *args)
-        sys.print_exception(e, _stream)
+        if ERROR >= (self.level or _level):
+            self.log(ERROR, msg, *args)
+            sys.print_exception(e, _stream)
 
     def exception(self, msg, *args):
         self.exc(sys.exc_info()[1], msg, *args)
@@ -83,11 +92,14 @@ def info(msg, *args):
 def debug(msg, *args):
     getLogger(None).debug(msg, *args)
 
-def basicConfig(level=INFO, filename=None, stream=None, format=None):
-    global _level, _stream
+def basicConfig(level=INFO, filename=None, stream=None, format=None,
+                timesource=None):
+    global _level, _stream, _timesource
     _level = level
     if stream:
         _stream = stream
+    # Callable returning the timestamp string prefixed to each record
+    _timesource = timesource
     if filename is not None:
         print("logging.basicConfig: filename arg is not supported")
     if format is not None:
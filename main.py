@@ -1,4 +1,9 @@
 """This file is executed the program on every boot."""
+import rain_gauge
+
+# A rain gauge tip is counted and sleeps again before the heavier imports
+rain_gauge.count_tip()
+
 import water_system
 
 water_system.run()
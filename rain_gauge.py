@@ -0,0 +1,117 @@
+"""Tipping bucket rain gauge.
+
+The gauge's reed switch closes a spare GPIO to ground for each tip, waking
+the device. main.py calls count_tip() before anything else, which counts
+the tip in RTC memory and goes straight back to sleep. Tips are counted per
+day and hour of the ESP32's own RTC, which set_time() keeps in local time
+so counting does not need the DS3231.
+"""
+import machine
+import esp32
+import utime
+import config
+import state
+
+# GPIOs which can wake the ESP32-C3 from deep sleep
+_WAKE_PINS = range(6)
+
+
+def present():
+    """Return True if a rain gauge is configured.
+
+    Raises:
+        ValueError: The configured pin cannot wake the ESP32-C3.
+    """
+    pin = config.RAIN_GAUGE_PIN
+    if pin is None:
+        return False
+    if pin not in _WAKE_PINS or pin in (
+            config.WAKEUP_PIN, config.WATER_ON_PIN, config.WATER_OFF_PIN,
+            config.BATTERY_PIN):
+        raise ValueError('RAIN_GAUGE_PIN %d is not a free wake pin' % pin)
+    return True
+
+
+def count_tip():
+    """If woken by a tip, count it and go back to sleep, not returning."""
+    if not present() or machine.reset_cause() != machine.DEEPSLEEP_RESET:
+        return
+    alarm = machine.Pin(config.WAKEUP_PIN, machine.Pin.IN,
+                        machine.Pin.PULL_UP)
+    if alarm.value() == 0:
+        return  # the DS3231 alarm, a normal wake
+    _count(machine.RTC().datetime())
+    state.save()
+    gauge = machine.Pin(config.RAIN_GAUGE_PIN, machine.Pin.IN,
+                        machine.Pin.PULL_UP)
+    start = utime.ticks_ms()
+    while (gauge.value() == 0 and utime.ticks_diff(
+            utime.ticks_ms(), start) < config.RAIN_GAUGE_RELEASE_MS):
+        utime.sleep_ms(5)
+    # Waking on a switch which is still closed would wake again at once
+    configure_wake(gauge=gauge.value() == 1)
+    machine.deepsleep()
+
+
+def configure_wake(gauge=True):
+    """Wake on the DS3231 alarm, and on gauge tips if gauge is True.
+
+    With the GPIO wake of esp32c3_wakeup_ext.patch WAKEUP_ALL_LOW wakes when
+    any of the pins is low.
+    """
+    pins = [machine.Pin(config.WAKEUP_PIN, machine.Pin.IN,
+                        machine.Pin.PULL_UP)]
+    if gauge and present():
+        pins.append(machine.Pin(config.RAIN_GAUGE_PIN, machine.Pin.IN,
+                                machine.Pin.PULL_UP))
+    esp32.wake_on_ext1(pins=tuple(pins), level=esp32.WAKEUP_ALL_LOW)
+
+
+def set_time(datetime):
+    """Set the ESP32 RTC used to date tips to the local date/time tuple."""
+    if present():
+        machine.RTC().datetime(tuple(datetime[:7]) + (0,))
+
+
+def rainfall():
+    """Rain in mm in the last complete hour and today.
+
+    The last complete hour matches ECAN's figure, the hour before a wake on
+    the hour.
+    """
+    now = machine.RTC().datetime()
+    counted = (state.get('gauge_day'), state.get('gauge_hour'))
+    if counted == (now[2], now[4]):
+        hour_tips = state.get('gauge_prev_hour_tips')
+    elif counted == _previous_hour(now):
+        hour_tips = state.get('gauge_hour_tips')
+    else:
+        hour_tips = 0
+    day_tips = (state.get('gauge_day_tips')
+                if counted[0] == now[2] else 0)
+    return (hour_tips * config.RAIN_GAUGE_MM_PER_TIP,
+            day_tips * config.RAIN_GAUGE_MM_PER_TIP)
+
+
+def _count(now):
+    # now is an RTC datetime tuple, the day is [2] and the hour [4]
+    counted = (state.get('gauge_day'), state.get('gauge_hour'))
+    if counted != (now[2], now[4]):
+        # The hour being counted becomes the previous hour if it was
+        state.set('gauge_prev_hour_tips',
+                  state.get('gauge_hour_tips')
+                  if counted == _previous_hour(now) else 0)
+        state.set('gauge_hour', now[4])
+        state.set('gauge_hour_tips', 0)
+    if counted[0] != now[2]:
+        state.set('gauge_day', now[2])
+        state.set('gauge_day_tips', 0)
+    state.set('gauge_day_tips', min(state.get('gauge_day_tips') + 1, 0xffff))
+    state.set('gauge_hour_tips', min(state.get('gauge_hour_tips') + 1, 0xff))
+
+
+def _previous_hour(now):
+    # (day of month, hour) of the hour before the RTC datetime tuple now
+    secs = utime.mktime((now[0], now[1], now[2], now[4], 0, 0, 0, 0))
+    before = utime.localtime(secs - 3600)
+    return before[2], before[3]
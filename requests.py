@@ -1,4 +1,6 @@
 import usocket
+import utime
+import timing
 
 ITER_CHUNK_SIZE = 128
 
@@ -9,6 +11,10 @@ class Response:
         self.encoding = "utf-8"
         self._content_consumed = False
         self._cached = None
+        # Time spent reading the body in microseconds
+        self.read_us = 0
+        # Server Date header, e.g. "Mon, 19 Oct 2026 05:00:01 GMT"
+        self.date = None
 
     def __enter__(self):
         return self
@@ -23,13 +29,17 @@ class Response:
         if self.raw:
             self.raw.close()
             self.raw = None
+            timing.add("body", self.read_us)
         self._cached = None
 
     @property
     def content(self):
         if self._cached is None:
             try:
+                start = utime.ticks_us()
                 self._cached = self.raw.read()
+                self.read_us += utime.ticks_diff(utime.ticks_us(), start)
+                timing.add("body", self.read_us)
             finally:
                 self.raw.close()
                 self.raw = None
@@ -46,7 +56,9 @@ class Response:
     def iter_content(self, chunk_size=ITER_CHUNK_SIZE):
         def generate():
             while True:
+                start = utime.ticks_us()
                 chunk = self.raw.read(chunk_size)
+                self.read_us += utime.ticks_diff(utime.ticks_us(), start)
                 if not chunk:
                     break
                 yield chunk
@@ -60,29 +72,61 @@ class Response:
 
         return generate()
 
-    def iter_lines(self, chunk_size=ITER_CHUNK_SIZE, delimiter=None):
-        pending = None
+    def readinto(self, buffer):
+        """Read the content into buffer, without allocating a chunk.
 
-        for chunk in self.iter_content(chunk_size=chunk_size):
-
-            if pending is not None:
-                chunk = pending + chunk
-
-            if delimiter:
-                lines = chunk.split(delimiter)
-            else:
-                lines = chunk.split(b'\n')
+        Returns:
+            The number of bytes read, 0 at the end of the content.
+        """
+        if self._content_consumed:
+            raise RuntimeError("response already consumed")
+        start = utime.ticks_us()
+        count = self.raw.readinto(buffer)
+        self.read_us += utime.ticks_diff(utime.ticks_us(), start)
+        if not count:
+            self._content_consumed = True
+        return count
 
-            if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
-                pending = lines.pop()
-            else:
-                pending = None
+    def iter_lines(self, chunk_size=ITER_CHUNK_SIZE, delimiter=b"\n"):
+        """Yield each line of the content, without the delimiter.
 
-            for line in lines:
-                yield line
+        The content is read into a buffer of at least chunk_size borrowed
+        from the pool, so reads do not allocate. Each line is a memoryview
+        into the buffer, only valid until the next line is requested. A line
+        longer than the buffer is split. Close the generator if it is not
+        read to the end, MicroPython does not finalise it, so the buffer
+        would not return to the pool.
+        """
+        import buffers
 
-        if pending is not None:
-            yield pending
+        if self._content_consumed:
+            raise RuntimeError("response already consumed")
+        mark = delimiter[0]
+        with buffers.borrow(chunk_size) as buffer:
+            view = memoryview(buffer)
+            size = len(buffer)
+            # Length of the partial line kept at the start of the buffer
+            length = 0
+            while True:
+                start = utime.ticks_us()
+                count = self.raw.readinto(view[length:])
+                self.read_us += utime.ticks_diff(utime.ticks_us(), start)
+                if not count:
+                    break
+                end = length + count
+                begin = 0
+                for i in range(length, end):
+                    if buffer[i] == mark:
+                        yield view[begin:i]
+                        begin = i + 1
+                if begin == 0 and end == size:
+                    yield view[0:end]
+                    begin = end
+                length = end - begin
+                view[0:length] = view[begin:end]
+            if length:
+                yield view[0:length]
+        self._content_consumed = True
 
 
 def request(method, url, data=None, json=None, headers={}, stream=None):
@@ -103,17 +147,21 @@ def request(method, url, data=None, json=None, headers={}, stream=None):
         host, port = host.split(":", 1)
         port = int(port)
 
+    t = utime.ticks_us()
     ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
     ai = ai[0]
+    t = timing.lap("dns", t)
 
     s = usocket.socket(ai[0], ai[1], ai[2])
     try:
         s.connect(ai[-1])
+        t = timing.lap("connect", t)
         if proto == "https:":
             s = ussl.wrap_socket(s, server_hostname=host)
-        s.write(b"%s /%s HTTP/1.0\r\n" % (method, path))
+            t = timing.lap("tls", t)
+        s.write("%s /%s HTTP/1.0\r\n" % (method, path))
         if not "Host" in headers:
-            s.write(b"Host: %s\r\n" % host)
+            s.write("Host: %s\r\n" % host)
         # Iterate over keys to avoid tuple alloc
         for k in headers:
             s.write(k)
@@ -132,10 +180,12 @@ def request(method, url, data=None, json=None, headers={}, stream=None):
             s.write(data)
 
         l = s.readline()
+        timing.lap("first_byte", t)
         #print(l)
         l = l.split(None, 2)
         status = int(l[1])
         reason = ""
+        date = None
         if len(l) > 2:
             reason = l[2].rstrip()
         while True:
@@ -148,6 +198,8 @@ def request(method, url, data=None, json=None, headers={}, stream=None):
                     raise ValueError("Unsupported " + l)
             elif l.startswith(b"Location:") and not 200 <= status <= 299:
                 raise NotImplementedError("Redirects not yet supported")
+            elif l[:5].lower() == b"date:":
+                date = l[5:].strip().decode()
     except OSError:
         s.close()
         raise
@@ -155,6 +207,7 @@ def request(method, url, data=None, json=None, headers={}, stream=None):
     resp = Response(s)
     resp.status_code = status
     resp.reason = reason
+    resp.date = date
     return resp
 
 
@@ -0,0 +1,178 @@
+"""State kept across deep sleep in RTC slow memory.
+
+The memory is read once, on first access, and written once by save(). It
+holds a fixed layout of typed values followed by the log buffer, behind a
+header with a layout version and CRC. Older layouts are migrated, anything
+unrecognised or corrupt (e.g. after power on) is replaced by defaults.
+"""
+import machine
+import ubinascii
+import ustruct
+
+_MAGIC = 0x57
+VERSION = 5
+
+# Magic, version, payload length, CRC32 of the payload
+_HEADER = '<BBHI'
+_HEADER_SIZE = 8
+
+# Name, struct type, default. A field no longer used keeps its place with
+# no name, as later versions only append fields.
+_FIELDS = (
+    ('connect_count', 'B', 0),  # failed WiFi connect attempts
+    ('close_ms', 'H', 0),  # time to close the log last wake
+    ('battery_mv', 'H', 0),  # battery voltage trend, 0 unknown
+    ('log_wakes', 'B', 0),  # wakes since the log buffer was flushed
+    ('relay', 'b', -1),  # last commanded relay state, -1 unknown
+    (None, 'I', 0),  # unused, was the time of the last wake
+    ('forecast_time', 'I', 0),  # GMT seconds since 2000 of forecast, 0 none
+    ('forecast_today', 'h', 0),  # forecast rain today, 0.1mm
+    ('forecast_tomorrow', 'h', 0),  # forecast rain tomorrow, 0.1mm
+    ('relay_wakes', 'B', 0),  # wakes since the relay was pulsed
+    ('wake_uah', 'H', 0),  # estimated charge used by the last wake
+    ('gauge_day', 'B', 0),  # day of month of gauge_day_tips
+    ('gauge_day_tips', 'H', 0),  # rain gauge tips that day
+    ('gauge_hour', 'B', 0),  # hour of gauge_hour_tips
+    ('gauge_hour_tips', 'B', 0),  # rain gauge tips that hour
+    ('gauge_prev_hour_tips', 'B', 0),  # tips the hour before, if counted
+)
+
+
+def _layout(count):
+    # Layout of the first count fields, versions only append fields
+    return '<' + ''.join(field[1] for field in _FIELDS[:count])
+
+
+_LAYOUT = _layout(len(_FIELDS))
+_LAYOUT_SIZE = ustruct.calcsize(_LAYOUT)
+
+_values = None
+_log = b''
+
+
+def get(name):
+    """Get a value."""
+    _load()
+    return _values[name]
+
+
+def set(name, value):
+    """Set a value, kept in RAM until save()."""
+    _load()
+    _values[name] = value
+
+
+def log():
+    """Get the log buffer contents."""
+    _load()
+    return _log
+
+
+def set_log(data):
+    """Set the log buffer contents, kept in RAM until save()."""
+    global _log
+    _load()
+    _log = bytes(data)
+
+
+def save():
+    """Write the state to RTC memory."""
+    _load()
+    size = _LAYOUT_SIZE + len(_log)
+    buf = bytearray(_HEADER_SIZE + size)
+    ustruct.pack_into(_LAYOUT, buf, _HEADER_SIZE,
+                      *[_values.get(field[0], field[2]) for field in _FIELDS])
+    buf[_HEADER_SIZE + _LAYOUT_SIZE:] = _log
+    payload = memoryview(buf)[_HEADER_SIZE:]
+    ustruct.pack_into(_HEADER, buf, 0, _MAGIC, VERSION, size,
+                      ubinascii.crc32(payload))
+    machine.RTC().memory(buf)
+
+
+def reset():
+    """Discard the state, restoring defaults."""
+    global _values, _log
+    _values = _defaults()
+    _log = b''
+
+
+def _load():
+    global _values, _log
+    if _values is not None:
+        return
+    mem = machine.RTC().memory()
+    _values = _defaults()
+    _log = b''
+    if len(mem) < _HEADER_SIZE:
+        return
+    magic, version, size, crc = ustruct.unpack_from(_HEADER, mem, 0)
+    payload = mem[_HEADER_SIZE:_HEADER_SIZE + size]
+    if magic == _MAGIC and len(payload) == size and \
+            ubinascii.crc32(payload) == crc:
+        migrate = _MIGRATIONS.get(version)
+        if migrate is not None:
+            migrate(payload)
+    elif magic != _MAGIC:
+        _from_unversioned(mem)
+
+
+def _from_v1(payload):
+    _restore(_layout(9), payload)
+
+
+def _from_v2(payload):
+    _restore(_layout(10), payload)
+
+
+def _from_v3(payload):
+    _restore(_layout(11), payload)
+
+
+def _from_v4(payload):
+    _restore(_layout(15), payload)
+
+
+def _from_v5(payload):
+    _restore(_LAYOUT, payload)
+
+
+def _restore(layout, payload):
+    # Layout must be a prefix of the current layout
+    global _log
+    values = ustruct.unpack_from(layout, payload, 0)
+    for i in range(len(values)):
+        if _FIELDS[i][0] is not None:
+            _values[_FIELDS[i][0]] = values[i]
+    _log = payload[ustruct.calcsize(layout):]
+
+
+def _from_unversioned(mem):
+    # Layout before versioning, the connect count in byte 0, log close time
+    # at 1, battery trend at 3, log wakes at 5, log length at 6, log at 8
+    global _log
+    if len(mem) < 8 or mem[0] > 6:
+        return
+    _values['connect_count'] = mem[0]
+    _values['battery_mv'] = mem[3] | mem[4] << 8
+    _values['log_wakes'] = mem[5]
+    length = mem[6] | mem[7] << 8
+    if 8 + length <= len(mem):
+        _log = mem[8:8 + length]
+
+
+# Layout version: function restoring values from a payload of that version
+_MIGRATIONS = {
+    1: _from_v1,
+    2: _from_v2,
+    3: _from_v3,
+    4: _from_v4,
+    5: _from_v5,
+}
+
+
+def _defaults():
+    values = {}
+    for name, _, default in _FIELDS:
+        if name is not None:
+            values[name] = default
+    return values
@@ -2,28 +2,42 @@
 from retrier import retry
 import requests
 from file_logger import File
+import events
 import watcher
 import secrets
-import clock
+import config
+import timing
+import state
+import weather
 
-_URL = (
-    'https://api.thingspeak.com/update.json'
-    '?api_key={key}&field1={f1}&field2={f2}&field3={f3}&field4={f4}'
-    '&field5={volts}&field6={status}')
+_URL = 'https://api.thingspeak.com/update.json?api_key={key}'
+_FIELD = '&field{}={}'
+_TIMING = '&field7={awake}'
+_ENERGY = '&field8={uah}'
 
 
 @retry(Exception, tries=5, delay=2, backoff=2.0, logger=File.logger())
 def send(rain_data, battery_volts):
-    """Send weather and system information to Thingspeak."""
+    """Send weather and system information to Thingspeak.
+
+    Fields without a value, e.g. a forecast that was not needed, are left
+    out.
+    """
     watcher.feed()
-    data = rain_data.get_data()
-    url = _URL.format(key=secrets.THINGSPEAK_API_KEY,
-                      f1=data[0], f2=data[1], f3=data[2], f4=data[3],
-                      volts=battery_volts,
-                      status=int(not rain_data.rainfall_occurring()))
-    File.logger().info('%s - Req to: %s', clock.timestamp(), url)
+    url = _URL.format(key=secrets.THINGSPEAK_API_KEY)
+    fields = rain_data.get_data() + (
+        battery_volts, int(not rain_data.rainfall_occurring()))
+    for number, value in enumerate(fields, 1):
+        if value is not None:
+            url += _FIELD.format(number, value)
+    if config.THINGSPEAK_TIMING:
+        url += _TIMING.format(awake=timing.awake_ms())
+    if config.THINGSPEAK_ENERGY:
+        # The estimate for this wake is only complete once it ends
+        url += _ENERGY.format(uah=state.get('wake_uah'))
+    File.logger().info('Req to: %s', url)
     with requests.get(url) as response:
-        File.logger().info('%s - HTTP status: %d', clock.timestamp(),
-                           response.status_code)
+        File.event(events.HTTP_STATUS, response.status_code)
+        weather.correct_clock(response)
         if response.status_code != 200:
             raise ValueError("HTTP status %d" % response.status_code)
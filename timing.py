@@ -0,0 +1,82 @@
+"""Awake time instrumentation, times the phases of a wake."""
+import utime
+import heap
+
+_spans = []  # (name, microseconds) in order of completion
+_open = []  # names of the spans currently being timed
+_start_ms = 0  # utime.ticks_ms() when the wake or run started
+
+
+class _Span:
+    """Context manager timing the enclosed block."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        heap.enter(self.name)
+        _open.append(self.name)
+        self.start = utime.ticks_us()
+        return self
+
+    def __exit__(self, *args):
+        us = utime.ticks_diff(utime.ticks_us(), self.start)
+        _open.pop()
+        add(self.name, us)
+        heap.leave(self.name)
+
+
+def span(name):
+    """Time a phase, nested phases are named parent.child."""
+    return _Span(name)
+
+
+def add(name, us):
+    """Record the duration of a phase in microseconds."""
+    if _open:
+        name = '.'.join(_open) + '.' + name
+    _spans.append((name, us))
+
+
+def lap(name, start):
+    """Record the time since start (from utime.ticks_us()) and return now."""
+    now = utime.ticks_us()
+    add(name, utime.ticks_diff(now, start))
+    return now
+
+
+def total_ms(name, nested=False):
+    """Total time of all recorded phases with the name, in milliseconds.
+
+    Args:
+        name: Name of the phase.
+        nested: Also include phases with the name nested in other phases.
+    """
+    us = 0
+    suffix = '.' + name
+    for span_name, span_us in _spans:
+        if span_name == name or (nested and span_name.endswith(suffix)):
+            us += span_us
+    return us // 1000
+
+
+def awake_ms():
+    """Time since the device woke, or since reset(), in milliseconds."""
+    return utime.ticks_diff(utime.ticks_ms(), _start_ms)
+
+
+def phases():
+    """Recorded phases as (name, milliseconds) in order of completion."""
+    return [(name, (us + 500) // 1000) for name, us in _spans]
+
+
+def record():
+    """Compact record of the phases as name=milliseconds pairs."""
+    return ' '.join('%s=%d' % phase for phase in phases())
+
+
+def reset():
+    """Discard recorded phases and start timing a new run from now."""
+    global _start_ms
+    del _spans[:]
+    _start_ms = utime.ticks_ms()
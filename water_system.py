@@ -1,75 +1,194 @@
 """Monitor local rainfall and disable garden watering system if required."""
 import machine
-import esp32
 import utime
 import clock
 import wifi
 import config
+import state
+import battery
+import rain_gauge
+import energy
 from file_logger import File
-import weather
+import events
+import timing
+import heap
 import watcher
-import thingspeak
 
+_RAIN_FIELDS = ('last_hour_mm', 'today_mm', 'forecast_today_mm',
+                'forecast_tomorrow_mm')
+_RELAY_STATES = {-1: None, 0: 'off', 1: 'on'}
 
-def run():
-    """Main entry point to execute this program."""
-    sleep_enabled = _sleep_enabled()
+# Results of the last run, reported by status()
+_rain_data = None
+_battery_volts = None
+
+
+def run(service=False):
+    """Main entry point to execute this program.
+
+    Args:
+        service: Called repeatedly by service(), never sleep and stay
+            connected to WiFi.
+    """
+    global _rain_data, _battery_volts
+    if service:
+        timing.reset()
+        heap.reset()
+        clock.reset_drift_check()
+        sleep_enabled = False
+    else:
+        # Time since wake spent booting and importing modules
+        timing.add('boot', utime.ticks_us())
+        sleep_enabled = _sleep_enabled()
     try:
-        File.logger().info('%s - Awake: %s', clock.timestamp(),
-                           machine.wake_reason())
+        File.event(events.AWAKE, machine.wake_reason())
+        if not service:
+            timing.add('close', state.get('close_ms') * 1000)
         rainfall = False
         next_wake = config.RTC_ALARM
-        battery_volts = _battery_voltage()
+        # The battery is on an ADC2 pin, which WiFi also uses, so it is read
+        # before associating. WiFi stays up between service runs, which reuse
+        # the reading service() took before connecting.
+        if service:
+            battery_volts = _battery_volts
+        else:
+            with timing.span('adc'):
+                battery_volts = battery.voltage()
+                _battery_volts = battery_volts
+        # Associate while doing the local work, until the network is needed
+        wifi.start()
+        File.event(events.BATTERY, battery_volts * 1000,
+                   battery.trend() * 1000)
+        rain_gauge.set_time(clock.datetime())
 
         if not sleep_enabled:
             watcher.disable()
 
-        if wifi.connect():
+        with timing.span('wifi'):
+            connected = wifi.wait()
+        if connected:
+            # Only needed once connected, so not imported on every wake
+            import weather
+            import thingspeak
             _resetConnectCount()
-            rain_data = weather.get_rain_data()
+            rain_data = weather.get_rain_data(_last_rainfall())
+            _rain_data = rain_data
             rainfall = rain_data.rainfall_occurring()
-            thingspeak.send(rain_data, battery_volts)
+            with timing.span('upload'):
+                thingspeak.send(rain_data, battery_volts)
 
             if rainfall:
-                File.logger().info('%s - System OFF', clock.timestamp())
-                _system_off()
+                File.event(events.SYSTEM_OFF)
             else:
-                File.logger().info('%s - System ON', clock.timestamp())
-                _system_on()
+                File.event(events.SYSTEM_ON)
+            _set_system(not rainfall)
         else:
             if _incrementConnectCount() > 5:
                 # Give up trying to connect to WiFi
                 _resetConnectCount()
             else:
-                File.logger().info('%s - Set one minute sleep, attempts %d',
-                                   clock.timestamp(), _getConnectCount())
+                File.event(events.WIFI_RETRY, _getConnectCount())
                 next_wake = config.SLEEP_ONE_MINUTE
 
     except Exception as ex:
         # Catch exceptions so that device goes back to sleep HTTP calls
         # fail with exceptions.
-        File.logger().exc(ex, '%s - Error', clock.timestamp())
+        File.logger().exc(ex, 'Error')
     finally:
         try:
-            wifi.disconnect()
+            if not service:
+                with timing.span('disconnect'):
+                    wifi.disconnect()
         except Exception as ex:
-            File.logger().exc(ex, '%s - WIFI disconnect error',
-                              clock.timestamp())
+            File.logger().exc(ex, 'WIFI disconnect error')
 
         if sleep_enabled:
-            File.logger().info('%s - Sleeping...', clock.timestamp())
-            File.close_log()
+            File.event(events.SLEEPING)
+            _close_log()
             _sleep_until(next_wake)
         else:
-            File.logger().info('%s - Not sleeping', clock.timestamp())
-            File.close_log()
+            File.event(events.NOT_SLEEPING)
+            _close_log(flush=True)
 
 
 def init_ftp():
+    File.flush_log()
+    state.save()
     wifi.connect()
     import ftp
 
 
+def init_http():
+    """Serve /status and /log over HTTP until interrupted."""
+    File.flush_log()
+    state.save()
+    wifi.connect()
+    import uasyncio
+    import http_server
+    uasyncio.run(http_server.serve(status))
+
+
+def service(http=False, minutes=None):
+    """Repeat run() on a schedule while serving logs, until interrupted.
+
+    For bench testing and soak runs. Between runs the FTP server, or the
+    HTTP diagnostics server if http is True, answers requests. Both share one
+    uasyncio loop, so a request is never handled in the middle of a run.
+
+    Args:
+        http: Serve HTTP diagnostics instead of FTP.
+        minutes: Minutes between runs, config.SERVICE_INTERVAL_MINS by
+            default.
+    """
+    global _battery_volts
+    File.flush_log()
+    # Before WiFi, which shares the battery's ADC2
+    _battery_volts = battery.voltage()
+    state.save()
+    wifi.connect()
+    import uasyncio
+    uasyncio.run(_service(http, minutes or config.SERVICE_INTERVAL_MINS))
+
+
+async def _service(http, minutes):
+    import uasyncio
+    if http:
+        import http_server
+        uasyncio.create_task(http_server.serve(status))
+    else:
+        import ftp_server
+        uasyncio.create_task(_poll_ftp(ftp_server.Server()))
+    while True:
+        start = utime.ticks_ms()
+        run(service=True)
+        elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+        await uasyncio.sleep_ms(max(minutes * 60000 - elapsed, 0))
+
+
+async def _poll_ftp(server):
+    import uasyncio
+    if server.start() is None:
+        return
+    while server.poll_once(0):
+        await uasyncio.sleep_ms(config.FTP_POLL_MS)
+
+
+def status():
+    """Results of the last run and the current state as a dict."""
+    rain = None
+    if _rain_data is not None:
+        rain = dict(zip(_RAIN_FIELDS, _rain_data.get_data()))
+        rain['rainfall'] = _rain_data.rainfall_occurring()
+    return {
+        'rain': rain,
+        'battery_volts': _battery_volts,
+        'battery_trend_volts': battery.trend(),
+        'relay': _RELAY_STATES[state.get('relay')],
+        'timing_ms': timing.phases(),
+        'awake_ms': timing.awake_ms(),
+    }
+
+
 def _sleep_until(alarm_time):
     _configure_pin_interrupt()
     clock.configure_rtc_alarm(alarm_time)
@@ -77,7 +196,29 @@ def _sleep_until(alarm_time):
 
 
 def _configure_pin_interrupt():
-    esp32.wake_on_ext1(pins=(config.WAKEUP_PIN,), level=esp32.WAKEUP_ALL_LOW)
+    rain_gauge.configure_wake()
+
+
+def _set_system(on):
+    # The relay latches, only pulse it when the state changes, or to guard
+    # against it not being in the recorded state every RELAY_REASSERT_WAKES
+    value = 1 if on else 0
+    wakes = state.get('relay_wakes') + 1
+    if state.get('relay') != value or wakes >= config.RELAY_REASSERT_WAKES:
+        if on:
+            _system_on()
+        else:
+            _system_off()
+        state.set('relay', value)
+        wakes = 0
+    else:
+        File.event(events.RELAY_UNCHANGED, wakes)
+    state.set('relay_wakes', min(wakes, 255))
+
+
+def _last_rainfall():
+    relay = state.get('relay')
+    return None if relay < 0 else relay == 0
 
 
 def _system_on():
@@ -88,39 +229,45 @@ def _system_off():
     _pulse_relay(config.WATER_OFF_PIN)
 
 
-def _pulse_relay(pin):
-    pin.value(1)
-    # 10ms minimum time to alter relay latch as per specification of G6SK-2
-    utime.sleep_ms(10)
-    pin.value(0)
+def _pulse_relay(pin_id):
+    pin = machine.Pin(pin_id, machine.Pin.OUT, machine.Pin.PULL_DOWN, value=0)
+    with timing.span('relay'):
+        pin.value(1)
+        # 10ms minimum time to alter relay latch as per specification of G6SK-2
+        utime.sleep_ms(10)
+        pin.value(0)
 
 
-def _battery_voltage():
-    adc = machine.ADC(config.BATTERY_PIN)
-    sum = 0
-    for x in range(0, config.ADC_READS):
-        sum += adc.read_uv() / 1000000
-    return (sum / config.ADC_READS) * config.RESISTOR_RATIO
+def _close_log(flush=False):
+    File.logger().info('Timing ms: %s', timing.record())
+    uah = energy.wake_uah()
+    File.event(events.ENERGY, uah, energy.battery_days(uah))
+    state.set('wake_uah', min(uah, 0xffff))
+    if config.HEAP_PROFILE:
+        File.logger().info('Heap bytes: %s', heap.record())
+    start = utime.ticks_us()
+    File.close_log(flush)
+    # Closing may write the log file, report it with the next wake's timing
+    ms = utime.ticks_diff(utime.ticks_us(), start) // 1000
+    state.set('close_ms', min(ms, 0xffff))
+    state.save()
 
 
 def _sleep_enabled():
-    return config.NO_SLEEP_PIN.value() == 0
+    pin = machine.Pin(config.NO_SLEEP_PIN, machine.Pin.IN,
+                      machine.Pin.PULL_DOWN)
+    return pin.value() == 0
 
 
 def _getConnectCount():
-    val = machine.RTC().memory()[0]
-    if val is not None:
-        return val
-    else:
-        machine.RTC().memory(bytes([0]))
-        return 0
+    return state.get('connect_count')
 
 
 def _incrementConnectCount():
     val = _getConnectCount() + 1
-    machine.RTC().memory(bytes([val]))
+    state.set('connect_count', val)
     return val
 
 
 def _resetConnectCount():
-    machine.RTC().memory(bytes([0]))
+    state.set('connect_count', 0)
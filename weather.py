@@ -1,12 +1,19 @@
 """Weather query module."""
 import ure
-import gc
+import config
+import utime
+import heap
 from retrier import retry
 import requests
 from file_logger import File
+import events
 import watcher
 import secrets
 import clock
+import timing
+import state
+import buffers
+import rain_gauge
 
 _RAIN_URL = (
    'http://data.ecan.govt.nz/data/78/Rainfall/'
@@ -16,25 +23,59 @@ _FORECAST_URL = \
     'https://api.met.no/weatherapi/locationforecast/2.0/compact?{}'.format(
         secrets.LOCATION)
 
+_SECS_IN_DAY = 24 * 3600
+
 
 class RainData:
     """Holds current and forecast rain data."""
 
-    def __init__(self):
-        """Constructor."""
+    def __init__(self, previous=None):
+        """Constructor.
+
+        Args:
+            previous: Result of rainfall_occurring() on the previous wake,
+                None if unknown.
+        """
+        self.previous = previous
         self.rain_last_hour_mm = 0
         self.rain_today_mm = 0
-        self.rain_today_mm = 0
-        self.rain_tomorrow_mm = 0
+        self.rain_forecast_today_mm = 0
+        self.rain_forecast_tomorrow_mm = 0
 
     def rainfall_occurring(self):
-        """Return True if the data indicated that rain has or will occur."""
-        return (self.rain_today_mm > 3 or self.rain_last_hour_mm > 1
-                or self.rain_forecast_today_mm > 10
-                or self.rain_forecast_tomorrow_mm > 10)
+        """Return True if the data indicated that rain has or will occur.
+
+        If rain was occurring on the previous wake the thresholds are lowered
+        by config.RAIN_HYSTERESIS_MM, so that the system is not switched on
+        and off repeatedly when the rainfall is close to a threshold.
+        """
+        return (self.observed_rain()
+                or self.forecast_rain(self.rain_forecast_today_mm,
+                                      self.rain_forecast_tomorrow_mm))
+
+    def observed_rain(self):
+        """Return True if the observed rain alone indicates rain.
+
+        The forecast can then not change the outcome of rainfall_occurring().
+        """
+        margin = self._margin()
+        return (self.rain_today_mm > 3 - margin
+                or self.rain_last_hour_mm > 1 - margin)
+
+    def forecast_rain(self, today_mm, tomorrow_mm):
+        """Return True if the forecast rain alone indicates rain.
+
+        Forecast rain only accumulates, so once this is True for part of the
+        forecast the rest can not change the outcome.
+        """
+        margin = self._margin()
+        return today_mm > 10 - margin or tomorrow_mm > 10 - margin
+
+    def _margin(self):
+        return config.RAIN_HYSTERESIS_MM if self.previous else 0
 
     def get_data(self):
-        """Return rain data as a tuple."""
+        """Return rain data as a tuple, forecasts are None if skipped."""
         return (self.rain_last_hour_mm, self.rain_today_mm,
                 self.rain_forecast_today_mm, self.rain_forecast_tomorrow_mm)
 
@@ -47,11 +88,29 @@ class RainData:
         self.rain_forecast_today_mm, self.rain_forecast_tomorrow_mm = forecast
 
 
-def get_rain_data():
-    """Get the rain data retrieved from the weather service."""
-    data = RainData()
-    data.set_from_weather(read_rainfall())
-    data.set_from_forecast(read_forecast())
+def get_rain_data(previous=None):
+    """Get the rain data retrieved from the weather service.
+
+    Args:
+        previous: Result of rainfall_occurring() on the previous wake, None
+            if unknown.
+    """
+    data = RainData(previous)
+    with timing.span('rain'):
+        if rain_gauge.present():
+            data.set_from_weather(_gauge_rainfall())
+        else:
+            data.set_from_weather(read_rainfall())
+    if data.observed_rain():
+        # Decided already, the forecast could only add to the rain
+        File.event(events.FORECAST_SKIPPED)
+        data.set_from_forecast((None, None))
+        return data
+    with timing.span('forecast'):
+        forecast = _cached_forecast()
+        if forecast is None:
+            forecast = read_forecast(data)
+        data.set_from_forecast(forecast)
     return data
 
 
@@ -60,101 +119,174 @@ def read_rainfall():
     """Read todays rainfall."""
     watcher.feed()
     rain_last_hour_mm, rain_today_mm = (0.0, 0.0)
-    File.logger().info('%s - Req to: %s', clock.timestamp(), _RAIN_URL)
+    File.logger().info('Req to: %s', _RAIN_URL)
     with requests.get(_RAIN_URL) as response:
-        File.logger().info('%s - HTTP status: %d', clock.timestamp(),
-                           response.status_code)
+        File.event(events.HTTP_STATUS, response.status_code)
+        correct_clock(response)
         if response.status_code == 200:
+            start = utime.ticks_us()
             first_line = True
-            for line in response.iter_lines():
-                if first_line:
-                    first_line = False
-                    continue
-                gc.collect()
-                text = line.decode('utf-8', 'ignore').strip()
-                values = text.split(',')
-                if len(values) == 3:
-                    day = int(values[1].split('/')[0])
-                    if day == clock.day_of_month():
-                        mm = float(values[2])
-                        rain_today_mm += mm
-                        rain_last_hour_mm = mm
+            today = clock.day_of_month()
+            lines = response.iter_lines()
+            # Return the pooled buffer even if parsing a line raises
+            try:
+                for line in lines:
+                    if first_line:
+                        first_line = False
+                        continue
+                    heap.sample()
+                    text = str(line, 'utf-8', 'ignore').strip()
+                    values = text.split(',')
+                    if len(values) == 3:
+                        day = int(values[1].split('/')[0])
+                        if day == today:
+                            mm = float(values[2])
+                            rain_today_mm += mm
+                            rain_last_hour_mm = mm
+            finally:
+                lines.close()
+            _add_parse_time(start, response)
         else:
             raise ValueError("HTTP status %d" % response.status_code)
 
-    File.logger().info('%s - Last hour %.1fmm, today %.1fmm',
-                       clock.timestamp(),
-                       rain_last_hour_mm, rain_today_mm)
+    File.event(events.RAINFALL, rain_last_hour_mm * 10, rain_today_mm * 10)
     print('Last hour %.1fmm, today %.1fmm' %
           (rain_last_hour_mm, rain_today_mm))
     return round(rain_last_hour_mm), round(rain_today_mm)
 
 
 @retry(Exception, tries=6, delay=2, backoff=2.0, logger=File.logger())
-def read_forecast():
-    """Read the weather forecast."""
+def read_forecast(rain_data=None):
+    """Read the weather forecast.
+
+    Args:
+        rain_data: If given, stop reading once the forecast so far decides
+            rain_data.forecast_rain(). The amounts returned are then only a
+            lower bound, and are not cached for later runs.
+    """
     watcher.feed()
 
-    start_regex = ure.compile(r'timeseries')
-    continue_regex = ure.compile(r'\},\{')
-    hour_regex = ure.compile(r'next_1_hours')
     precip_regex = ure.compile(r'precipitation_amount\":(\d+\.\d)')
-    date_regex = ure.compile(r'time\":\"(\d+-\d+-\d+)T')
-    # Large chunk size more performant as less regex's run. Must be less than
-    # characters in one timeseries element in the response.
-    chunkSize = 1000
-    windowSize = chunkSize * 2
+    # Each timeseries element starts with its time, the next one ends it
+    time_key = b'"time":"'
+    hour_key = b'next_1_hours'
+    # Must hold at least one timeseries element of the response
+    windowSize = 2000
 
     rain_today_mm, rain_tomorrow_mm = (0.0, 0.0)
-    window = memoryview(bytearray(windowSize))
-    emptyChunk = bytes(chunkSize)
-    periodFound, hourFound, precipFound, dateFound = False, False, False, False
-
-    File.logger().info('%s - Req to: %s', clock.timestamp(), _FORECAST_URL)
-    with requests.get(_FORECAST_URL,
-                      headers=secrets.HEADER) as response:
-        File.logger().info('%s - HTTP status: %d', clock.timestamp(),
-                           response.status_code)
+    stopped = False
+
+    File.logger().info('Req to: %s', _FORECAST_URL)
+    with requests.get(_FORECAST_URL, headers=secrets.HEADER) as response, \
+            buffers.borrow(windowSize) as buffer:
+        File.event(events.HTTP_STATUS, response.status_code)
+        correct_clock(response)
+        # Read the RTC once, once corrected, rather than for each entry
+        today = clock.midnight()
         if response.status_code == 200 or response.status_code == 203:
-            for chunk in response.iter_content(chunkSize):
-                # Populate response window
-                window[0:chunkSize] = window[chunkSize:windowSize]
-                if len(chunk) == chunkSize:
-                    window[chunkSize:windowSize] = chunk
+            start = utime.ticks_us()
+            window = memoryview(buffer)[0:windowSize]
+            # Length of the unparsed element kept at the start of the window
+            length = 0
+            while True:
+                count = response.readinto(window[length:windowSize])
+                end = length + count
+                # find() and regex require bytes
+                windowBytes = bytes(window[0:end])
+                heap.sample()
+                begin = windowBytes.find(time_key)
+                if begin < 0:
+                    # Still in the header, keep what may start the first key
+                    begin = max(end - len(time_key) + 1, 0)
                 else:
-                    # last chunk is short
-                    window[chunkSize:windowSize] = emptyChunk
-                    window[chunkSize:chunkSize+len(chunk)] = chunk
-                # print(window)
-                windowBytes = bytes(window)  # regex requires bytes
-                # Gather precipitation data
-                if continue_regex.search(windowBytes) or\
-                   start_regex.search(windowBytes):
-                    periodFound = True
-                if periodFound and hour_regex.search(windowBytes):
-                    hourFound = True
-                if periodFound and not dateFound:
-                    if (dateGroup := date_regex.search(windowBytes)):
-                        dateFound = True
-                        date = dateGroup.group(1).decode()
-                if hourFound and not precipFound:
-                    if (precipGroup := precip_regex.search(windowBytes)):
-                        precipFound = True
+                    while begin < end:
+                        # The last element is only complete at the end
+                        finish = windowBytes.find(time_key, begin + 1)
+                        if finish < 0:
+                            if count and end - begin < windowSize:
+                                break
+                            finish = end
+                        element = windowBytes[begin:finish]
+                        begin = finish
+                        date_at = len(time_key)
+                        date = element[date_at:date_at + 10].decode()
+                        date_secs = clock.date_seconds(date)
+                        if date_secs > today + _SECS_IN_DAY:
+                            count = 0
+                            break
+                        hour_at = element.find(hour_key)
+                        if hour_at < 0:
+                            continue
+                        precipGroup = precip_regex.search(element[hour_at:])
+                        if not precipGroup:
+                            continue
                         mm = float(precipGroup.group(1))
-                if dateFound and precipFound:
-                    periodFound, hourFound = False, False
-                    dateFound, precipFound = False, False
-                    # print(date, mm)
-                    if clock.greater_than_tommorow(date):
-                        break
-                    elif clock.equal_to_today(date):
-                        rain_today_mm += mm
-                    else:
-                        rain_tomorrow_mm += mm
+                        # print(date, mm)
+                        if date_secs == today:
+                            rain_today_mm += mm
+                        else:
+                            rain_tomorrow_mm += mm
+                        if rain_data is not None and rain_data.forecast_rain(
+                                round(rain_today_mm), round(rain_tomorrow_mm)):
+                            File.event(events.FORECAST_STOPPED)
+                            stopped = True
+                            break
+                if stopped or not count:
+                    break
+                length = end - begin
+                window[0:length] = window[begin:end]
+            _add_parse_time(start, response)
         else:
             raise ValueError('HTTP status %d' % response.status_code)
 
-    File.logger().info('%s - Today %.1fmm, tomorrow %.1fmm', clock.timestamp(),
-                       rain_today_mm, rain_tomorrow_mm)
+    File.event(events.FORECAST, rain_today_mm * 10, rain_tomorrow_mm * 10)
     print('Today %.1fmm, tomorrow %.1fmm' % (rain_today_mm, rain_tomorrow_mm))
+    if stopped:
+        # A stopped forecast is a lower bound, never reuse it or an older one
+        state.set('forecast_time', 0)
+    else:
+        state.set('forecast_time', clock.seconds())
+        state.set('forecast_today', min(round(rain_today_mm * 10), 32767))
+        state.set('forecast_tomorrow',
+                  min(round(rain_tomorrow_mm * 10), 32767))
     return round(rain_today_mm), round(rain_tomorrow_mm)
+
+
+def _cached_forecast():
+    # The forecast read by an earlier run, as read_forecast() returns it, if
+    # it is recent and for the same local day, else None
+    cached = state.get('forecast_time')
+    if not config.FORECAST_CACHE_MINS or not cached:
+        return None
+    now = clock.seconds()
+    offset = config.HOURS_DIFF_FROM_GMT * 3600
+    if (not 0 <= now - cached <= config.FORECAST_CACHE_MINS * 60
+            or (now + offset) // _SECS_IN_DAY !=
+            (cached + offset) // _SECS_IN_DAY):
+        return None
+    today, tomorrow = state.get('forecast_today'), state.get(
+        'forecast_tomorrow')
+    File.event(events.FORECAST_CACHED, today, tomorrow)
+    return round(today / 10), round(tomorrow / 10)
+
+
+def correct_clock(response):
+    """Correct the RTC from the time of an HTTP response, if it drifted."""
+    drift = clock.correct_drift(response.date)
+    if drift is not None:
+        File.event(events.CLOCK_CORRECTED, drift)
+
+
+def _gauge_rainfall():
+    # Observed rain from the local gauge, as read_rainfall() returns it
+    rain_last_hour_mm, rain_today_mm = rain_gauge.rainfall()
+    File.event(events.RAINFALL, rain_last_hour_mm * 10, rain_today_mm * 10)
+    print('Last hour %.1fmm, today %.1fmm' %
+          (rain_last_hour_mm, rain_today_mm))
+    return round(rain_last_hour_mm), round(rain_today_mm)
+
+
+def _add_parse_time(start, response):
+    # Time spent processing the response, excluding waiting for its content
+    us = utime.ticks_diff(utime.ticks_us(), start) - response.read_us
+    timing.add('parse', us)
@@ -2,39 +2,61 @@
 import network
 from utime import ticks_ms, ticks_diff, sleep
 import secrets
-import clock
 from file_logger import File
 
 WIFI_DELAY = 10
 CHECK_INTERVAL = 0.1
 
+# When start() began associating, None if it has not been called
+_start_ms = None
+
 
 def connect():
     """Connect to WiFi."""
-    secs = WIFI_DELAY
-    start = ticks_ms()
+    start()
+    return wait()
 
+
+def start():
+    """Start associating, so other work can be done until wait()."""
+    global _start_ms
     sta_if = network.WLAN(network.STA_IF)
+    if sta_if.isconnected():
+        # Reconnecting would drop the sockets of any running server
+        if _start_ms is None:
+            _start_ms = ticks_ms()
+        return
+    _start_ms = ticks_ms()
     sta_if.active(True)
     sta_if.connect(secrets.WIFI_SSID, secrets.WIFI_PASSPHRASE)
 
-    while secs >= 0 and not sta_if.isconnected():
+
+def wait():
+    """Wait for start() to connect, up to WIFI_DELAY seconds after it."""
+    global _start_ms
+    if _start_ms is None:
+        start()
+    sta_if = network.WLAN(network.STA_IF)
+    while (not sta_if.isconnected()
+           and ticks_diff(ticks_ms(), _start_ms) < WIFI_DELAY * 1000):
         sleep(CHECK_INTERVAL)
-        secs -= CHECK_INTERVAL
 
     if sta_if.isconnected():
-        File.logger().info('%s - Connected, address: %s in %d ms',
-                           clock.timestamp(),
-                           sta_if.ifconfig()[0], ticks_diff(ticks_ms(), start))
+        File.logger().info('Connected, address: %s in %d ms',
+                           sta_if.ifconfig()[0],
+                           ticks_diff(ticks_ms(), _start_ms))
         return True
     else:
+        _start_ms = None
         sta_if.active(False)
-        File.logger().error('%s - WiFi did not connect' % clock.timestamp())
+        File.logger().error('WiFi did not connect')
         return False
 
 
 def disconnect():
     """Disconnect from WiFi."""
+    global _start_ms
+    _start_ms = None
     sta_if = network.WLAN(network.STA_IF)
     if sta_if.isconnected():
         sta_if.disconnect()